@@ -3,17 +3,64 @@
 # $env:PYTHONUTF8="1"
 
 import json
+import threading
 import streamlit as st
-from requests import HTTPError
-from extract_info import ExtractInfoModule
-from format_output import FormatOutputModule
-from spoonacular_api import search_recipes
-from classes import info_to_requests
+from pathlib import Path
+from extract_info import ExtractInfoModule, FusedExtractInfoModule, extract_engine, extract_cascade
+from extract_cache import ExtractCache
+from similar_cache import SimilarPromptCache
+from extract_metrics import ExtractMetrics
+from http_transport import connection_stats
+from spoonacular_api import search_cache, quota_limiter, recipe_store
+from lm import num_parallel, small_lm, lm, ModelResidency
+from format_output import FormatOutputModule, format_mode
+from markdown_renderer import NO_RESULTS, render_extracted_info, render_search_response
+from search_planner import planned_search
+from speculative_search import SpeculativeSearch
+from detail_hydration import lazy_details, summary_search, detail_hydrator
+from classes import ExtractedInfo
+
+# Load the models once per process in the background, so the first request does not wait for the model load
+@st.cache_resource
+def get_model_residency():
+    residency = ModelResidency(models=[lm, small_lm] if extract_cascade else [lm])
+    threading.Thread(target=residency.warm, daemon=True).start()
+    return residency
+
+# Initialize extraction metrics to global cache so they accumulate across sessions
+@st.cache_resource
+def get_extract_metrics():
+    return ExtractMetrics()
 
 # Initialize extraction module to global cache
 @st.cache_resource
 def get_extractor():
-    return ExtractInfoModule()
+    if extract_engine == "fused":
+        return FusedExtractInfoModule(metrics=get_extract_metrics())
+    return ExtractInfoModule(
+        max_workers=num_parallel,
+        fast_path=True,
+        metrics=get_extract_metrics(),
+        small_lm=small_lm if extract_cascade else None,
+        shared_prefix=True
+    )
+
+# Initialize extraction result cache for the compiled programs and settings of the selected engine
+@st.cache_resource
+def get_extract_cache():
+    if extract_engine == "fused":
+        return ExtractCache(program_paths=(Path("optimized", "extract_fused_optimized.json"),), engine="fused")
+    return ExtractCache(
+        program_paths=(Path("optimized", "extract_optimized.json"), Path("optimized", "extract_nutrition_optimized.json")),
+        engine="per_field",
+        fast_path=True,
+        small_model=small_lm.model if extract_cascade else None
+    )
+
+# Initialize near-duplicate prompt cache to global cache
+@st.cache_resource
+def get_similar_cache():
+    return SimilarPromptCache()
 
 # Initialize formatter module to global cache
 @st.cache_resource
@@ -21,9 +68,27 @@ def get_formatter():
     return FormatOutputModule()
 
 # Use the local method to get from streamlit cache if doing a rerun
+get_model_residency()
+extract_metrics = get_extract_metrics()
 extract_module = get_extractor()
+extract_cache = get_extract_cache()
+similar_cache = get_similar_cache()
 format_module = get_formatter()
 
+# Define a helper function to find a previous answer for the same or a near-duplicate prompt
+def cached_criteria(text: str) -> ExtractedInfo | None:
+    info = extract_cache.get(text)
+    if info is None:
+        info = similar_cache.get(text)
+    return info
+
+# Define a helper function to render the extracted criteria as a two column table
+def criteria_table(values: dict) -> dict:
+    return {
+        "criteria": list(values),
+        "value": [", ".join(v) if isinstance(v, list) else str(v) for v in values.values()]
+    }
+
 # Define a helper function to auto submit demo prompts
 def auto_send(text: str):
     st.session_state.auto_prompt = text
@@ -37,6 +102,21 @@ if demo_1.button("Dinner for two", use_container_width=True):
 if demo_2.button("Meals for family of four", use_container_width=True):
     auto_send("Plan two lunches and two dinners for a family of four. Pears and cheese sticks are favorites, and we do not like peanut butter. Try to keep the meals high in protein and low in fat.")
 
+# Optional panel with per-field extraction metrics
+if st.sidebar.checkbox("Show extraction metrics"):
+    st.sidebar.dataframe(extract_metrics.table(), hide_index=True)
+    st.sidebar.download_button("Download metrics JSON", json.dumps(extract_metrics.summary(), indent=4), file_name="extract_metrics.json")
+    st.sidebar.caption("Connection reuse")
+    st.sidebar.dataframe([{"client": c, **s} for c, s in connection_stats().items()], hide_index=True)
+    if search_cache is not None:
+        st.sidebar.caption("Recipe search cache")
+        st.sidebar.dataframe([search_cache.stats()], hide_index=True)
+    if recipe_store is not None:
+        st.sidebar.caption("Local recipe store")
+        st.sidebar.dataframe([recipe_store.stats()], hide_index=True)
+    st.sidebar.caption("Spoonacular quota")
+    st.sidebar.dataframe([quota_limiter.stats()], hide_index=True)
+
 # Setup streamlit title
 st.title("💬 Meal Planner Chatbot")
 
@@ -55,27 +135,63 @@ if user_input:
     # Display user message in chat container
     st.chat_message("user").markdown(user_input)
 
-    # Start spinner to indicate processing
-    with st.spinner("Extracting meal criteria..."):
-        meal_info = extract_module.extract_meal_criteria(text=user_input)
-        requests = info_to_requests(meal_info)
-        json_string = meal_info.model_dump_json()
-        markdown_meal_info = format_module.format_as_markdown(text=json_string)
-
-    st.chat_message("assistant").markdown(json_string)
-    st.chat_message("assistant").markdown(markdown_meal_info)
-    # st.chat_message("assistant").markdown(requests)
-
-    with st.spinner("Searching recipes..."):
-        try:
-            recipes = search_recipes(model=requests)
-        except HTTPError:
-            st.write("An error occurred in the search: ", HTTPError )
+    # Start the recipe search in the background as soon as the search-critical criteria are known
+    # In lazy mode the search returns summaries and only the chosen recipes are fetched in full
+    if lazy_details:
+        speculative_search = SpeculativeSearch(
+            search=summary_search, hydrate=detail_hydrator.hydrate, search_again=planned_search
+        )
+    else:
+        speculative_search = SpeculativeSearch()
+
+    # Release the background search even when extraction fails
+    with speculative_search:
+        # Start spinner to indicate processing
+        with st.spinner("Extracting meal criteria..."):
+            meal_info = cached_criteria(user_input)
+            if meal_info is None:
+                # Show each criterion as soon as its extractor returns
+                table = st.chat_message("assistant").empty()
+                values = {}
+                for field, value in extract_module.stream_meal_criteria(text=user_input):
+                    values[field] = value
+                    speculative_search.update(field, value)
+                    table.table(criteria_table(values))
+
+                # Validate the assembled criteria as a whole before using them
+                meal_info = ExtractedInfo(**values)
+                similar_cache.put(user_input, meal_info)
+                extract_cache.put(user_input, meal_info)
+            else:
+                for field, value in meal_info.model_dump().items():
+                    speculative_search.update(field, value)
+
+            json_string = meal_info.model_dump_json()
+            if format_mode == "prose":
+                markdown_meal_info = format_module.format_as_markdown(text=json_string)
+            else:
+                markdown_meal_info = render_extracted_info(meal_info)
+
+        st.chat_message("assistant").markdown(json_string)
+        st.chat_message("assistant").markdown(markdown_meal_info)
+
+        with st.spinner("Searching recipes..."):
+            _, recipes = speculative_search.finish()
+
+            # In prose mode every recipe is formatted up front, concurrently and from the shared cache
+            if format_mode == "prose":
+                shown = [recipe for r in recipes if not isinstance(r, Exception) for recipe in r.results or []]
+                formatted = iter(format_module.format_recipes(shown))
 
     for r in recipes:
-        json_string = json.dumps(r.model_dump())
-        #st.chat_message("assistant").markdown(json_string)
-        recipe_markdown = format_module.format_as_markdown(text=json_string)
+        # A failed search is reported for its meal without hiding the others
+        if isinstance(r, Exception):
+            st.chat_message("assistant").write(f"An error occurred in the search: {r}")
+            continue
+        if format_mode == "prose":
+            recipe_markdown = "\n\n---\n\n".join(next(formatted) for _ in r.results or []) or NO_RESULTS
+        else:
+            recipe_markdown = render_search_response(r)
         st.chat_message("assistant").markdown(recipe_markdown)
 
 # Run program with streamlit run app.py
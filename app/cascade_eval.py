@@ -0,0 +1,52 @@
+import time
+from difflib import SequenceMatcher
+from dspy_data import dev_set
+from extract_info import ExtractInfoModule, PROMPT_FIELDS, MEAL_COUNT_FIELDS, predictor_fields
+from lm import small_lm
+
+# Score one field the same way the optimizer metric does
+def field_score(gold, predicted) -> float:
+    if isinstance(gold, list):
+        return SequenceMatcher(None, gold, predicted).ratio()
+    return float(gold == predicted)
+
+module = ExtractInfoModule(small_lm=small_lm)
+names = ["meal_count", *MEAL_COUNT_FIELDS, *PROMPT_FIELDS]
+fields = [field for name in names for field in predictor_fields(name)]
+stats = {field: {"large_score": 0.0, "cascade_score": 0.0, "large_time": 0.0, "cascade_time": 0.0, "escalated": 0} for field in fields}
+
+for example in dev_set:
+    for name in names:
+        # Give the dependent fields the gold meal count so each predictor is measured on its own
+        inputs = {"meal_count": example.output["meal_count"]} if name in MEAL_COUNT_FIELDS else {}
+
+        start = time.perf_counter()
+        module.small_lm = None
+        large = module.extract_fields(name, example.text, **inputs)
+        large_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        module.small_lm = small_lm
+        cascade, escalated = module.cascade_fields(name, example.text, **inputs)
+        cascade_time = time.perf_counter() - start
+
+        # A predictor answering several fields has its time split evenly across them
+        for field in predictor_fields(name):
+            gold = example.output[field]
+            stats[field]["large_score"] += field_score(gold, large[field])
+            stats[field]["cascade_score"] += field_score(gold, cascade[field])
+            stats[field]["large_time"] += large_time / len(predictor_fields(name))
+            stats[field]["cascade_time"] += cascade_time / len(predictor_fields(name))
+            stats[field]["escalated"] += escalated
+
+count = len(dev_set)
+print(f"{'field':<20}{'large acc':>10}{'cascade acc':>12}{'change':>8}{'escalated':>10}{'large s':>9}{'cascade s':>10}{'saved':>8}")
+for field, s in stats.items():
+    saved = 1 - s["cascade_time"] / s["large_time"] if s["large_time"] else 0.0
+    change = (s["cascade_score"] - s["large_score"]) / count
+    print(f"{field:<20}{s['large_score'] / count:>10.2f}{s['cascade_score'] / count:>12.2f}{change:>+8.2f}"
+          f"{s['escalated'] / count:>10.2f}{s['large_time'] / count:>9.2f}{s['cascade_time'] / count:>10.2f}{saved:>8.0%}")
+
+large_total = sum(s["large_time"] for s in stats.values())
+cascade_total = sum(s["cascade_time"] for s in stats.values())
+print(f"Total seconds per prompt: large {large_total / count:.2f}, cascade {cascade_total / count:.2f}, saved {1 - cascade_total / large_total:.0%}")
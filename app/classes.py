@@ -1,45 +1,38 @@
-import difflib
 from pydantic import BaseModel
 from typing import List, Optional, Literal
 from enums import *
+from enum_matcher import cuisine_matcher, diet_matcher, intolerance_matcher, meal_type_matcher
 
 
-# Define field validators
+# Define field validators, each enum has a prebuilt matcher with memoized results
 def match_cuisine(value: list[str]) -> list[Cuisine] | None:
     if value is None: return None
-    matched = []
-    for val in value:
-        matches = difflib.get_close_matches(val, [c.value for c in Cuisine], n=1, cutoff=0.7)
-        if matches:
-            matched.append(Cuisine(matches[0]))
-    return matched
+    return cuisine_matcher.match_all(value)
 
 def match_diet(value: list[str]) -> list[Diet] | None:
     if value is None: return None
-    matched = []
-    for val in value:
-        matches = difflib.get_close_matches(val, [d.value for d in Diet], n=1, cutoff=0.7)
-        if matches:
-            matched.append(Diet(matches[0]))
-    return matched
+    return diet_matcher.match_all(value)
 
 def match_intolerance(value: list[str]) -> list[Intolerance] | None:
     if value is None: return None
-    matched = []
-    for val in value:
-        matches = difflib.get_close_matches(val, [i.value for i in Intolerance], n=1, cutoff=0.7)
-        if matches:
-            matched.append(Intolerance(matches[0]))
-    return matched
+    return intolerance_matcher.match_all(value)
 
 def match_meal_type(value: list[str]) -> list[MealType] | None:
     if value is None: return None
-    matched = []
-    for val in value:
-        matches = difflib.get_close_matches(val, [m.value for m in MealType], n=1, cutoff=0.7)
-        if matches:
-            matched.append(MealType(matches[0]))
-    return matched
+    return meal_type_matcher.match_all(value)
+
+
+# Spoonacular nutrient name and bound for each nutrition parameter of a search request
+NUTRIENT_PARAMS = {
+    "minFiber": ("Fiber", "min"),
+    "minProtein": ("Protein", "min"),
+    "maxCalories": ("Calories", "max"),
+    "maxCarbs": ("Carbohydrates", "max"),
+    "maxFat": ("Fat", "max"),
+    "maxCholesterol": ("Cholesterol", "max"),
+    "maxSaturatedFat": ("Saturated Fat", "max"),
+    "maxSodium": ("Sodium", "max"),
+}
 
 
 # Pydantic models for recipe requests and responses
@@ -96,6 +89,17 @@ class WinePairing(BaseModel):
     productMatches: Optional[List[ProductMatch]] = None
 
 
+class Nutrient(BaseModel):
+    name: Optional[str] = None
+    amount: Optional[float] = None
+    unit: Optional[str] = None
+    percentOfDailyNeeds: Optional[float] = None
+
+
+class RecipeNutrition(BaseModel):
+    nutrients: Optional[List[Nutrient]] = None
+
+
 class RecipeDetail(RecipeSummary):
     preparationMinutes: Optional[int] = None
     license: Optional[str] = None
@@ -127,6 +131,7 @@ class RecipeDetail(RecipeSummary):
     extendedIngredients: Optional[List[ExtendedIngredient]] = None
     summary: Optional[str] = None
     winePairing: Optional[WinePairing] = None
+    nutrition: Optional[RecipeNutrition] = None
 
     # Include this inner class to force enums to be printed as values instead of enums
     class Config:
@@ -151,6 +156,7 @@ class SearchRecipesRequest(BaseModel):
     excludeIngredients: Optional[List[str]] = None
     type: Optional[MealType] = None
     minServings: Optional[int] = None
+    maxReadyTime: Optional[int] = None
     minFiber: Optional[int] = None
     minProtein: Optional[int] = None
     maxCalories: Optional[int] = None
@@ -194,15 +200,20 @@ class ExtractedInfo(BaseModel):
         use_enum_values = True
 
 
-def info_to_requests( info: ExtractedInfo) -> list[SearchRecipesRequest] | None:
+def info_to_requests( info: ExtractedInfo) -> list[SearchRecipesRequest]:
     requests = []
+    # Match the enum fields once, every meal shares them
     meal_types = match_meal_type(info.meal_types)
+    cuisines = match_cuisine(info.include_cuisines)
+    exclude_cuisines = match_cuisine(info.exclude_cuisines)
+    diets = match_diet(info.diets)
+    intolerances = match_intolerance(info.intolerances)
     for m in range(info.meal_count):
         request = SearchRecipesRequest(
-            cuisine = match_cuisine(info.include_cuisines),
-            excludeCuisine = match_cuisine(info.exclude_cuisines),
-            diet = match_diet(info.diets),
-            intolerances = match_intolerance(info.intolerances),
+            cuisine = cuisines,
+            excludeCuisine = exclude_cuisines,
+            diet = diets,
+            intolerances = intolerances,
             includeIngredients = info.include_ingredients,
             excludeIngredients = info.exclude_ingredients,
             type = meal_types[m % len(meal_types)] if len(meal_types) > 0 else None,
@@ -217,4 +228,4 @@ def info_to_requests( info: ExtractedInfo) -> list[SearchRecipesRequest] | None:
             maxSodium = Nutrition.LOW_SODIUM if info.low_sodium else None
         )
         requests.append(request)
-        return requests
+    return requests
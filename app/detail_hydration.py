@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+from classes import *
+from search_planner import planned_search
+from spoonacular_api import get_recipe_information_bulk, recipe_store
+
+# Search for recipe summaries first and fetch the details of the chosen recipes afterwards, set LAZY_DETAILS=1.
+# A bulk detail call costs a point plus half a point per further recipe, so this only saves quota when searches fetch
+# far more results than are shown, or when the shown recipes are mostly in the local store already
+lazy_details = os.getenv("LAZY_DETAILS") == "1"
+
+
+def summary_request(request: SearchRecipesRequest) -> SearchRecipesRequest:
+    # The same search without the per-result instructions and nutrition that make it heavy and costly
+    return request.model_copy(update={"addRecipeInstructions": False, "addRecipeNutrition": False})
+
+
+def summary_search(requests: list[SearchRecipesRequest],
+                   search: Callable[[list[SearchRecipesRequest]], list[SearchRecipesResponse | Exception]] = planned_search
+                   ) -> list[SearchRecipesResponse | Exception]:
+    """
+    Run the lightweight first phase of a search, returning recipe summaries only.
+
+    Parameters:
+    - requests: One request per meal slot
+    - search: Function that runs the searches
+
+    Returns:
+    - list[SearchRecipesResponse | Exception]: One response of summaries or error per slot
+    """
+    return search([summary_request(r) for r in requests])
+
+
+class DetailHydrator:
+    """
+    Replaces the recipe summaries of search responses with full recipe details.
+
+    Details are looked up per recipe id in memory and in the local recipe store, and every recipe found in neither
+    is fetched in a single bulk call.
+    """
+    def __init__(self, fetch: Callable[[list[int]], list[RecipeDetail]] = get_recipe_information_bulk, max_entries: int = 1024):
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.details = OrderedDict()
+        self.lock = threading.Lock()
+
+    def is_detailed(self, recipe: RecipeDetail) -> bool:
+        # Results of a search with instructions and nutrition need no further fetch
+        return bool(recipe.instructions) and recipe.nutrition is not None
+
+    def cached(self, recipe_id: int) -> RecipeDetail | None:
+        with self.lock:
+            if recipe_id in self.details:
+                self.details.move_to_end(recipe_id)
+                return self.details[recipe_id]
+        return recipe_store.get(recipe_id) if recipe_store is not None else None
+
+    def remember(self, details: list[RecipeDetail]):
+        with self.lock:
+            for detail in details:
+                self.details[detail.id] = detail
+                self.details.move_to_end(detail.id)
+            while len(self.details) > self.max_entries:
+                self.details.popitem(last=False)
+
+    def hydrate(self, responses: list[SearchRecipesResponse | Exception]) -> list[SearchRecipesResponse | Exception]:
+        """
+        Fetch the full details of every recipe in the responses.
+
+        Parameters:
+        - responses: Search responses with recipe summaries, or errors
+
+        Returns:
+        - list[SearchRecipesResponse | Exception]: The responses with full recipe details, errors are passed through
+          and a failed detail fetch fails every response that needed it
+        """
+        wanted = [
+            r.id for response in responses if not isinstance(response, Exception)
+            for r in response.results or [] if not self.is_detailed(r)
+        ]
+        details = {}
+        missing = []
+        for recipe_id in dict.fromkeys(wanted):
+            detail = self.cached(recipe_id)
+            if detail is None:
+                missing.append(recipe_id)
+            else:
+                details[recipe_id] = detail
+
+        error = None
+        if missing:
+            try:
+                fetched = self.fetch(missing)
+                self.remember(fetched)
+                details.update((d.id, d) for d in fetched)
+            except Exception as e:
+                error = e
+
+        hydrated = []
+        for response in responses:
+            if isinstance(response, Exception):
+                hydrated.append(response)
+            elif error is not None and any(r.id in missing for r in response.results or []):
+                hydrated.append(error)
+            else:
+                # Recipes Spoonacular no longer knows keep their summary
+                results = [r if self.is_detailed(r) else details.get(r.id, r) for r in response.results or []]
+                hydrated.append(response.model_copy(update={"results": results}))
+        return hydrated
+
+
+detail_hydrator = DetailHydrator()
@@ -1,10 +1,12 @@
 import json
+import os
 import pathlib
 from difflib import SequenceMatcher
 import dspy
 from pydantic import BaseModel
 from dspy_data import train_set, dev_set
-from extract_info import ExtractInfoModule
+from lm import lm
+from extract_info import ExtractInfoModule, FusedExtractInfoModule, ExtractNutritionTargets, NUTRITION_FIELDS, extract_engine
 
 class TestResult(BaseModel):
     prompt: str
@@ -50,10 +52,45 @@ def information_extraction_metric(gold, pred, trace=None):
     else:
         return score / 17 # Normalize to 0.0-1.0
 
-student = ExtractInfoModule()
+def nutrition_targets_metric(gold, pred, trace=None):
+    score = 0
+    for field in NUTRITION_FIELDS:
+        if gold[field] == getattr(pred, field): score += 1
+
+    if trace is not None:
+        return score >= len(NUTRITION_FIELDS)
+    else:
+        return score / len(NUTRITION_FIELDS) # Normalize to 0.0-1.0
+
+# Flatten an example into the nutrition predictor's own input and output fields
+def nutrition_example(example):
+    flags = {field: example.output[field] for field in NUTRITION_FIELDS}
+    return dspy.Example(meal_plan_prompt=example.text, **flags).with_inputs("meal_plan_prompt")
+
+# Set OPTIMIZE_TARGET=nutrition to compile only the multi-label nutrition predictor
+optimize_target = os.getenv("OPTIMIZE_TARGET", "extractor")
+metric = information_extraction_metric
+
+# Pick the extraction engine to compile, set EXTRACT_ENGINE=fused to compile the single-call engine
+if optimize_target == "nutrition":
+    # A bare predictor does not configure dspy the way the extraction modules do
+    dspy.configure(lm=lm)
+    student = dspy.ChainOfThought(signature=ExtractNutritionTargets)
+    optimized_file = "extract_nutrition_optimized.json"
+    metric = nutrition_targets_metric
+    train_set = [nutrition_example(example) for example in train_set]
+    dev_set = [nutrition_example(example) for example in dev_set]
+elif extract_engine == "fused":
+    student = FusedExtractInfoModule()
+    optimized_file = "extract_fused_optimized.json"
+    # Name the example fields after the signature so labeled demos render in the prompt
+    train_set = [example.copy(meal_plan_prompt=example.text, extracted_info=example.output) for example in train_set]
+else:
+    student = ExtractInfoModule()
+    optimized_file = "extract_optimized.json"
 
 bootstrap_optimizer = dspy.BootstrapFewShot(
-    metric=information_extraction_metric,
+    metric=metric,
     metric_threshold=0.75,
     max_labeled_demos=16,
     max_bootstrapped_demos=4,
@@ -67,8 +104,8 @@ optimized_program = bootstrap_optimizer.compile(student=student, trainset=train_
 def test_unoptimized():
     scores = []
     for example in dev_set:
-        response = student.extract_meal_criteria(text=example.text)
-        score = information_extraction_metric(example, response)
+        response = student(**example.inputs())
+        score = metric(example, response)
         scores.append(score)
     print("Scores for unoptimized module: ", scores)
     print("Cumulative score for unoptimized module: ", sum(scores))
@@ -77,8 +114,8 @@ def test_unoptimized():
 def test_optimized():
     scores = []
     for example in dev_set:
-        response = optimized_program(text=example.text)
-        score = information_extraction_metric(example, response)
+        response = optimized_program(**example.inputs())
+        score = metric(example, response)
         scores.append(score)
     print("Scores for optimized module: ", scores)
     print("Cumulative score for optimized module: ", sum(scores))
@@ -88,11 +125,11 @@ test_unoptimized()
 test_optimized()
 
 # Export the optimized model
-path = pathlib.Path("optimized", "extract_optimized.json")
+path = pathlib.Path("optimized", optimized_file)
 optimized_program.save(str(path))
 
 # Export the test results for review
-if save_results:
+if save_results and test_results:
     path = pathlib.Path("optimized", "test_results.json")
     with open(path, "w") as f:
         json.dump([r.model_dump() for r in test_results], f, indent=4)
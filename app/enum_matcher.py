@@ -0,0 +1,139 @@
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from enum import Enum
+from functools import lru_cache
+from enums import *
+
+# Common ways of writing enum values that are not close enough in spelling to match fuzzily
+CUISINE_SYNONYMS = {
+    "tex mex": Cuisine.MEXICAN,
+    "latin": Cuisine.LATIN_AMERICAN,
+    "middle east": Cuisine.MIDDLE_EASTERN,
+    "english": Cuisine.BRITISH,
+    "scandinavian": Cuisine.NORDIC,
+    "soul food": Cuisine.SOUTHERN,
+    "creole": Cuisine.CAJUN,
+}
+
+DIET_SYNONYMS = {
+    "keto": Diet.KETOGENIC,
+    "veggie": Diet.VEGETARIAN,
+    "pescetarian": Diet.PESCATARIAN,
+    "plant based": Diet.VEGAN,
+    "whole 30": Diet.WHOLE30,
+    "fodmap": Diet.LOW_FODMAP,
+    "celiac": Diet.GLUTEN_FREE,
+    "no gluten": Diet.GLUTEN_FREE,
+}
+
+INTOLERANCE_SYNONYMS = {
+    "peanut butter": Intolerance.PEANUT,
+    "nut": Intolerance.TREE_NUT,
+    "almond": Intolerance.TREE_NUT,
+    "cashew": Intolerance.TREE_NUT,
+    "walnut": Intolerance.TREE_NUT,
+    "milk": Intolerance.DAIRY,
+    "lactose": Intolerance.DAIRY,
+    "cheese": Intolerance.DAIRY,
+    "fish": Intolerance.SEAFOOD,
+    "shrimp": Intolerance.SHELLFISH,
+    "crab": Intolerance.SHELLFISH,
+    "lobster": Intolerance.SHELLFISH,
+    "soya": Intolerance.SOY,
+    "sulphite": Intolerance.SULFITE,
+}
+
+MEAL_TYPE_SYNONYMS = {
+    "dinner": MealType.MAIN,
+    "lunch": MealType.MAIN,
+    "supper": MealType.MAIN,
+    "entree": MealType.MAIN,
+    "main": MealType.MAIN,
+    "main dish": MealType.MAIN,
+    "side": MealType.SIDE,
+    "starter": MealType.APPETIZER,
+    "brunch": MealType.BREAKFAST,
+    "finger food": MealType.FINGERFOOD,
+}
+
+
+def normalize_value(value: str) -> str:
+    # Fold case and treat hyphens, underscores and repeated spaces as one space
+    return re.sub(r"[\s_\-]+", " ", value.casefold()).strip()
+
+
+def value_variants(value: str) -> set[str]:
+    # Singular and plural spellings of the last word
+    variants = {value, f"{value}s", f"{value}es"}
+    if value.endswith("ies"):
+        variants.add(f"{value[:-3]}y")
+    elif value.endswith("es"):
+        variants.add(value[:-2])
+    if value.endswith("s"):
+        variants.add(value[:-1])
+    return variants
+
+
+def trigrams(value: str) -> set[str]:
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EnumMatcher:
+    """
+    Matches free text to enum members, built once per enum.
+
+    Values are looked up exactly after case folding and plural stripping, then in the synonym table, and last by
+    fuzzy similarity against the candidates that share a trigram with the value. Results are memoized.
+    """
+    def __init__(self, enum: type[Enum], synonyms: dict[str, Enum] | None = None, cutoff: float = 0.7, cache_size: int = 4096):
+        self.enum = enum
+        self.cutoff = cutoff
+
+        # Exact lookup for every spelling of every value and synonym
+        self.lookup = {}
+        for name, member in [*((m.value, m) for m in enum), *(synonyms or {}).items()]:
+            for variant in value_variants(normalize_value(name)):
+                self.lookup.setdefault(variant, member)
+
+        # Trigram index over the canonical spellings for the fuzzy fallback
+        self.index = defaultdict(set)
+        for key in self.lookup:
+            for trigram in trigrams(key):
+                self.index[trigram].add(key)
+
+        self.match = lru_cache(maxsize=cache_size)(self.find)
+
+    def find(self, value: str) -> Enum | None:
+        value = normalize_value(value)
+        if value in self.lookup:
+            return self.lookup[value]
+
+        # Score only candidates sharing a trigram, most shared first, with the same ratio difflib uses
+        shared = Counter(key for trigram in trigrams(value) for key in self.index.get(trigram, ()))
+        best, best_ratio = None, 0.0
+        matcher = SequenceMatcher(b=value)
+        for key, _ in shared.most_common():
+            matcher.set_seq1(key)
+            floor = max(best_ratio, self.cutoff)
+            if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= self.cutoff and ratio > best_ratio:
+                best, best_ratio = key, ratio
+        return self.lookup[best] if best is not None else None
+
+    def match_all(self, values: list[str]) -> list[Enum]:
+        matched = []
+        for value in values:
+            member = self.match(value)
+            if member is not None:
+                matched.append(member)
+        return matched
+
+
+cuisine_matcher = EnumMatcher(Cuisine, CUISINE_SYNONYMS)
+diet_matcher = EnumMatcher(Diet, DIET_SYNONYMS)
+intolerance_matcher = EnumMatcher(Intolerance, INTOLERANCE_SYNONYMS)
+meal_type_matcher = EnumMatcher(MealType, MEAL_TYPE_SYNONYMS)
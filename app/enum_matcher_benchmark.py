@@ -0,0 +1,53 @@
+import difflib
+import random
+import time
+from enums import *
+from enum_matcher import EnumMatcher, CUISINE_SYNONYMS, DIET_SYNONYMS, INTOLERANCE_SYNONYMS, MEAL_TYPE_SYNONYMS
+
+# Values as the extractor returns them: exact, recased, plural, hyphenated, misspelled and unmatched
+def variants(value: str) -> list[str]:
+    return [
+        value,
+        value.lower(),
+        value.upper(),
+        value + "s",
+        value.replace(" ", "-"),
+        value[:-1],
+        value[:2] + value[3:],
+        "fresh " + value,
+    ]
+
+UNMATCHED = ["chicken breast", "pears", "cheese sticks", "broccoli", "brown rice", "olive oil", "tofu", "salmon"]
+
+# The validators before the prebuilt matchers, one difflib search over the freshly built value list per value
+def difflib_match(enum: type[Enum], values: list[str]) -> list[Enum]:
+    matched = []
+    for val in values:
+        matches = difflib.get_close_matches(val, [e.value for e in enum], n=1, cutoff=0.7)
+        if matches:
+            matched.append(enum(matches[0]))
+    return matched
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+random.seed(1)
+enums = [(Cuisine, CUISINE_SYNONYMS), (Diet, DIET_SYNONYMS), (Intolerance, INTOLERANCE_SYNONYMS), (MealType, MEAL_TYPE_SYNONYMS)]
+print(f"{'enum':<14}{'values':>8}{'difflib ms':>12}{'cold ms':>10}{'warm ms':>10}{'cold x':>8}{'warm x':>8}{'agree':>8}")
+for enum, synonyms in enums:
+    pool = [v for e in enum for v in variants(e.value)] + UNMATCHED
+    values = [random.choice(pool) for _ in range(20000)]
+
+    # The cold run builds a fresh matcher and fills its memo, the warm run answers from the memo
+    legacy = timed(lambda: difflib_match(enum, values))
+    start = time.perf_counter()
+    matcher = EnumMatcher(enum, synonyms)
+    matcher.match_all(values)
+    cold = time.perf_counter() - start
+    warm = timed(lambda: matcher.match_all(values))
+
+    # How often both paths pick the same member, the matcher also resolves synonyms and case the old path missed
+    agree = sum(difflib_match(enum, [v]) == matcher.match_all([v]) for v in set(values)) / len(set(values))
+    print(f"{enum.__name__:<14}{len(values):>8}{legacy * 1000:>12.1f}{cold * 1000:>10.1f}{warm * 1000:>10.1f}{legacy / cold:>7.0f}x{legacy / warm:>7.0f}x{agree:>8.2f}")
@@ -0,0 +1,108 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+from classes import ExtractedInfo
+from lm import lm
+
+
+def normalize_prompt(text: str) -> str:
+    # Fold case, unicode variants and whitespace so trivially different prompts share a key
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .!?")
+
+
+def file_fingerprint(path: Path) -> str:
+    # Hash the compiled program so re-optimizing it changes every key
+    if not path.exists():
+        return "uncompiled"
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class ExtractCache:
+    """
+    Cache of extracted meal criteria, keyed by normalized prompt, model names, compiled programs and fast path setting.
+
+    Entries are kept in memory with LRU eviction and persisted to a SQLite file so they survive restarts. Each
+    extraction engine keeps its own entries in the shared file, and entries the same engine wrote with a different
+    model, cascade small model, compiled programs or fast path setting are dropped when the cache is opened.
+    """
+    def __init__(self,
+                 path: Path = Path("cache", "extract_cache.sqlite"),
+                 program_paths: tuple[Path, ...] = (Path("optimized", "extract_optimized.json"),),
+                 model: str = lm.model,
+                 engine: str = "per_field",
+                 fast_path: bool = False,
+                 small_model: str | None = None,
+                 max_entries: int = 256):
+        self.max_entries = max_entries
+        self.engine = engine
+        # Every compiled program the engine loads, so recompiling any one of them changes every key
+        programs = ":".join(f"{path}={file_fingerprint(path)}" for path in program_paths)
+        # Cascade answers come from the small model when it is confident, so they are kept apart from the model's own
+        cascade = f"cascade={small_model}" if small_model is not None else "no_cascade"
+        self.fingerprint = hashlib.sha256(f"{model}:{engine}:{fast_path}:{cascade}:{programs}".encode()).hexdigest()
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Open the persistent store and drop this engine's entries from other models, programs or settings
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS extract_cache "
+            "(key TEXT PRIMARY KEY, engine TEXT NOT NULL, fingerprint TEXT NOT NULL, info TEXT NOT NULL)"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(extract_cache)")]
+        if "engine" not in columns:
+            # Files written before engines were told apart only held per-field entries
+            self.db.execute("ALTER TABLE extract_cache ADD COLUMN engine TEXT NOT NULL DEFAULT 'per_field'")
+        self.db.execute(
+            "DELETE FROM extract_cache WHERE engine = ? AND fingerprint != ?", (self.engine, self.fingerprint)
+        )
+        self.db.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.fingerprint}:{normalize_prompt(text)}".encode()).hexdigest()
+
+    def remember(self, key: str, info: ExtractedInfo):
+        # Keep the entry in memory as most recently used, evicting the oldest beyond the limit
+        self.memory[key] = info
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, text: str) -> ExtractedInfo | None:
+        key = self.key(text)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+
+            row = self.db.execute("SELECT info FROM extract_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            info = ExtractedInfo.model_validate_json(row[0])
+            self.remember(key, info)
+            return info
+
+    def put(self, text: str, info: ExtractedInfo):
+        key = self.key(text)
+        with self.lock:
+            self.remember(key, info)
+            self.db.execute(
+                "INSERT OR REPLACE INTO extract_cache (key, engine, fingerprint, info) VALUES (?, ?, ?, ?)",
+                (key, self.engine, self.fingerprint, info.model_dump_json())
+            )
+            self.db.commit()
+
+    def get_or_extract(self, text: str, extract: Callable[[str], ExtractedInfo]) -> ExtractedInfo:
+        info = self.get(text)
+        if info is None:
+            info = extract(text)
+            self.put(text, info)
+        return info
@@ -1,9 +1,21 @@
+import contextvars
+import logging
+import os
 import dspy
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator
+from dspy.utils.exceptions import AdapterParseError
+from pydantic import ValidationError
 from lm import lm
 from pathlib import Path
-from classes import ExtractedInfo
+from classes import ExtractedInfo, match_cuisine, match_diet, match_intolerance, match_meal_type
+from fast_extract import pre_extract
+from extract_cache import normalize_prompt
+from extract_metrics import ExtractMetrics
+from prompt_layout import SharedPrefixAdapter
 from enums import *
 
+logger = logging.getLogger(__name__)
 
 # Define DSPy Signatures
 class ExtractMealCount(dspy.Signature):
@@ -121,116 +133,161 @@ class ExtractExcludeIngredients(dspy.Signature):
     meal_plan_prompt: str = dspy.InputField()
     exclude_ingredients: list[str] = dspy.OutputField()
 
-class ExtractHighFiber(dspy.Signature):
+class ExtractNutritionTargets(dspy.Signature):
     """
     You are an information-extraction specialist. Always:
     - Read the entire input carefully
     - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
+    - Return each field exactly as a single boolean, with no additional commentary
     - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a high fiber diet?"
-    - Return a default value of False if no mention is made of fiber
+    - Each field answers the question, "True or false, does the given prompt include a request for this nutrition target?"
+    - high_fiber is a high fiber diet, high_protein is a high protein diet, low_calorie is a low calorie diet
+    - low_carb is a low carb diet, low_fat is a low fat diet, low_cholesterol is a low cholesterol diet
+    - low_sat_fat is a diet low in saturated fat, low_sodium is a low sodium or low salt diet
+    - Return a default value of False for any nutrient that is not mentioned
     """
     meal_plan_prompt: str = dspy.InputField()
     high_fiber: bool = dspy.OutputField()
-
-class ExtractHighProtein(dspy.Signature):
-    """
-    You are an information-extraction specialist. Always:
-    - Read the entire input carefully
-    - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
-    - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a high protein diet?"
-    - Return a default value of False if no mention is made of protein
-    """
-    meal_plan_prompt: str = dspy.InputField()
     high_protein: bool = dspy.OutputField()
-
-class ExtractLowCalorie(dspy.Signature):
-    """
-    You are an information-extraction specialist. Always:
-    - Read the entire input carefully
-    - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
-    - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a low calorie diet?"
-    - Return a default value of False if no mention is made of calories
-    """
-    meal_plan_prompt: str = dspy.InputField()
     low_calorie: bool = dspy.OutputField()
-
-class ExtractLowCarb(dspy.Signature):
-    """
-    You are an information-extraction specialist. Always:
-    - Read the entire input carefully
-    - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
-    - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a low carb diet?"
-    - Return a default value of False if no mention is made of carbs
-    """
-    meal_plan_prompt: str = dspy.InputField()
     low_carb: bool = dspy.OutputField()
-
-class ExtractLowFat(dspy.Signature):
-    """
-    You are an information-extraction specialist. Always:
-    - Read the entire input carefully
-    - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
-    - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a low fat diet?"
-    - Return a default value of False if no mention is made of fat
-    """
-    meal_plan_prompt: str = dspy.InputField()
     low_fat: bool = dspy.OutputField()
-
-class ExtractLowCholesterol(dspy.Signature):
-    """
-    You are an information-extraction specialist. Always:
-    - Read the entire input carefully
-    - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
-    - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a low cholesterol diet?"
-    - Return a default value of False if no mention is made of cholesterol
-    """
-    meal_plan_prompt: str = dspy.InputField()
     low_cholesterol: bool = dspy.OutputField()
-
-class ExtractLowSatFat(dspy.Signature):
-    """
-    You are an information-extraction specialist. Always:
-    - Read the entire input carefully
-    - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
-    - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a diet low in saturated fat?"
-    - Return a default value of False if no mention is made of saturated fat
-    """
-    meal_plan_prompt: str = dspy.InputField()
     low_sat_fat: bool = dspy.OutputField()
+    low_sodium: bool = dspy.OutputField()
 
-class ExtractLowSodium(dspy.Signature):
+class ExtractAllInfo(dspy.Signature):
     """
     You are an information-extraction specialist. Always:
     - Read the entire input carefully
     - Extract only the fields and information requested
-    - Return them exactly as a single boolean, with no additional commentary
     - Think in terms of entire meals only, not recipes or courses
-    - Your response should answer the question, "True or false, does the given prompt include a request for a low sodium diet?"
-    - Return a default value of False if no mention is made of sodium or salt
+    - meal_count answers "How many meals are being requested?"
+    - people_per_meal answers "How many people are attending each meal?"
+    - meal_types, cuisines, diets and intolerances are lists of strings, and are empty if none are mentioned
+    - Do not include any ingredients not specifically described in the prompt
+    - Each nutrition flag is True only if the prompt requests that nutrition target, and False otherwise
     """
     meal_plan_prompt: str = dspy.InputField()
-    low_sodium: bool = dspy.OutputField()
+    extracted_info: ExtractedInfo = dspy.OutputField()
+
+
+# Extraction engine to use, "per_field" runs one predictor per field and "fused" runs a single predictor
+extract_engine = os.getenv("EXTRACT_ENGINE", "per_field")
+
+
+# Call a predictor, recording it under the field name when metrics are enabled
+def call_predictor(predictor: dspy.Module, field: str, metrics: ExtractMetrics | None, **inputs) -> dspy.Prediction:
+    if metrics is None:
+        return predictor(**inputs)
+
+    # Enable the metrics callback and usage tracking for this call only
+    with dspy.context(callbacks=[*dspy.settings.callbacks, metrics], track_usage=True):
+        with metrics.track(field) as call:
+            prediction = predictor(**inputs)
+            call.usage = prediction.get_lm_usage() or {}
+    return prediction
+
+
+# Run the small model first and escalate low-confidence fields, set EXTRACT_CASCADE=1 to enable in the app
+extract_cascade = os.getenv("EXTRACT_CASCADE") == "1"
+
+# Sampling settings for the two small model answers compared in cascade mode
+CASCADE_SAMPLE_CONFIG = {"temperature": 0.7}
+
+# Enum matchers for list fields, every value the small model returns must match one
+ENUM_MATCHERS = {
+    "meal_types": match_meal_type,
+    "include_cuisines": match_cuisine,
+    "exclude_cuisines": match_cuisine,
+    "diets": match_diet,
+    "intolerances": match_intolerance,
+}
+
+
+def is_confident(field: str, first, second) -> bool:
+    # Two samples must agree, and the answer must be usable as it stands
+    if isinstance(first, list) and isinstance(second, list):
+        if {str(v).casefold() for v in first} != {str(v).casefold() for v in second}:
+            return False
+        matcher = ENUM_MATCHERS.get(field)
+        return matcher is None or len(matcher(first)) == len(first)
+    if first != second:
+        return False
+    if isinstance(first, int) and not isinstance(first, bool):
+        return first >= 1
+    return True
+
+
+# Nutrition flags answered together by the multi-label nutrition predictor
+NUTRITION_FIELDS = [
+    "high_fiber",
+    "high_protein",
+    "low_calorie",
+    "low_carb",
+    "low_fat",
+    "low_cholesterol",
+    "low_sat_fat",
+    "low_sodium",
+]
+
+# ExtractedInfo fields answered by each predictor, predictors not listed answer the one field they are named for
+PREDICTOR_FIELDS = {
+    "nutrition_targets": NUTRITION_FIELDS,
+}
+
+# Predictors that work from the prompt alone
+PROMPT_FIELDS = [
+    "include_cuisines",
+    "exclude_cuisines",
+    "diets",
+    "intolerances",
+    "include_ingredients",
+    "exclude_ingredients",
+    "nutrition_targets",
+]
+
+# Predictors that also need the extracted meal count as an input
+MEAL_COUNT_FIELDS = [
+    "people_per_meal",
+    "meal_types",
+]
+
+
+def predictor_fields(name: str) -> list[str]:
+    return PREDICTOR_FIELDS.get(name, [name])
+
+
+def is_settled(name: str, settled: dict) -> bool:
+    # A predictor is skipped only when every field it answers is already settled
+    return all(field in settled for field in predictor_fields(name))
 
 
 # Collect DSPy signatures into a module
 class ExtractInfoModule(dspy.Module):
-    def __init__(self):
+    def __init__(self,
+                 max_workers: int = 1,
+                 fast_path: bool = False,
+                 metrics: ExtractMetrics | None = None,
+                 small_lm: dspy.LM | None = None,
+                 shared_prefix: bool = False):
         super().__init__()
 
+        # Number of extractors to run at once, 1 runs them one after another
+        self.max_workers = max_workers
+
+        # Answer the meal count and nutrition flags with rules when they are unambiguous
+        self.fast_path = fast_path
+
+        # Per-field latency, token and retry instrumentation
+        self.metrics = metrics
+
+        # Smaller model tried first for every field, only low-confidence fields use the configured model
+        self.small_lm = small_lm
+
+        # Lay out prompts with the shared request first so the model server can reuse its prefix cache
+        self.adapter = SharedPrefixAdapter() if shared_prefix else None
+
         # Configure dspy
         dspy.configure(lm=lm)
 
@@ -248,40 +305,257 @@ class ExtractInfoModule(dspy.Module):
         self.get_intolerances = dspy.ChainOfThought(signature=ExtractIntolerances)
         self.get_include_ingredients = dspy.ChainOfThought(signature=ExtractIncludeIngredients)
         self.get_exclude_ingredients = dspy.ChainOfThought(signature=ExtractExcludeIngredients)
-        self.get_high_fiber = dspy.ChainOfThought(signature=ExtractHighFiber)
-        self.get_high_protein = dspy.ChainOfThought(signature=ExtractHighProtein)
-        self.get_low_calorie = dspy.ChainOfThought(signature=ExtractLowCalorie)
-        self.get_low_carb = dspy.ChainOfThought(signature=ExtractLowCarb)
-        self.get_low_fat = dspy.ChainOfThought(signature=ExtractLowFat)
-        self.get_low_cholesterol = dspy.ChainOfThought(signature=ExtractLowCholesterol)
-        self.get_low_sat_fat = dspy.ChainOfThought(signature=ExtractLowSatFat)
-        self.get_low_sodium = dspy.ChainOfThought(signature=ExtractLowSodium)
+        self.get_nutrition_targets = dspy.ChainOfThought(signature=ExtractNutritionTargets)
+
+        # Load the separately optimized nutrition predictor once it has been compiled
+        nutrition_path = Path("optimized", "extract_nutrition_optimized.json")
+        if nutrition_path.exists():
+            self.get_nutrition_targets.load(str(nutrition_path))
+
+    def extract_fields(self, name: str, text: str, **inputs) -> dict[str, object]:
+        if self.small_lm is not None:
+            return self.cascade_fields(name, text, **inputs)[0]
+
+        prediction = self.predict(name, name, meal_plan_prompt=text, **inputs)
+        return {field: getattr(prediction, field) for field in predictor_fields(name)}
+
+    def predict(self, name: str, label: str, **inputs) -> dspy.Prediction:
+        # Each predictor is named get_<name> and answers the fields listed for it
+        predictor = getattr(self, f"get_{name}")
+        with dspy.context(adapter=self.adapter):
+            return call_predictor(predictor, label, self.metrics, **inputs)
+
+    def sample_small(self, name: str, text: str, **inputs) -> dspy.Prediction:
+        with dspy.context(lm=self.small_lm):
+            return self.predict(name, f"{name}.small", meal_plan_prompt=text, config=CASCADE_SAMPLE_CONFIG, **inputs)
+
+    def cascade_fields(self, name: str, text: str, **inputs) -> tuple[dict[str, object], bool]:
+        fields = predictor_fields(name)
+
+        # Sample the small model twice at once, each sample in a copy of the caller's dspy context
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.sample_small, name, text, **inputs)
+                for _ in range(2)
+            ]
+
+        # Keep the small model's answer when the samples agree and check out, an unparseable answer escalates
+        try:
+            first, second = [future.result() for future in futures]
+            if all(is_confident(field, getattr(first, field), getattr(second, field)) for field in fields):
+                return {field: getattr(first, field) for field in fields}, False
+        except (AdapterParseError, ValidationError, ValueError) as e:
+            logger.warning("Escalating %s, the small model answer could not be parsed: %s", name, e)
+
+        # Escalate to the configured model
+        prediction = self.predict(name, name, meal_plan_prompt=text, **inputs)
+        return {field: getattr(prediction, field) for field in fields}, True
+
+    def iter_values(self, text: str, settled: dict) -> Iterator[tuple[str, object]]:
+        # Call the extractors one after another for every field not already settled
+        meal_count = settled.get("meal_count")
+        if meal_count is None:
+            meal_count = self.extract_fields("meal_count", text)["meal_count"]
+            yield "meal_count", meal_count
+        for name in MEAL_COUNT_FIELDS + PROMPT_FIELDS:
+            if is_settled(name, settled):
+                continue
+            inputs = {"meal_count": meal_count} if name in MEAL_COUNT_FIELDS else {}
+            for field, value in self.extract_fields(name, text, **inputs).items():
+                if field not in settled:
+                    yield field, value
+
+    def iter_values_concurrent(self, text: str, settled: dict) -> Iterator[tuple[str, object]]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Queue the meal count first, since the dependent fields wait on it
+            futures = {}
+            if "meal_count" not in settled:
+                futures[executor.submit(self.extract_fields, "meal_count", text)] = "meal_count"
+            for name in PROMPT_FIELDS:
+                if not is_settled(name, settled):
+                    futures[executor.submit(self.extract_fields, name, text)] = name
+
+            def submit_dependents(meal_count: int):
+                for dependent in MEAL_COUNT_FIELDS:
+                    if not is_settled(dependent, settled):
+                        futures[executor.submit(self.extract_fields, dependent, text, meal_count=meal_count)] = dependent
+
+            if "meal_count" in settled:
+                submit_dependents(settled["meal_count"])
+
+            # Hand back each field as soon as its predictor returns
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    values = future.result()
+                    if name == "meal_count":
+                        submit_dependents(values["meal_count"])
+                    for field, value in values.items():
+                        if field not in settled:
+                            yield field, value
+
+    def stream_meal_criteria_with_sources(self, text: str) -> Iterator[tuple[str, object, str]]:
+        # Settle what the rules can answer before calling the LM for the rest
+        settled = pre_extract(text) if self.fast_path else {}
+        for field, value in settled.items():
+            yield field, value, "rules"
+
+        if self.max_workers > 1:
+            values = self.iter_values_concurrent(text, settled)
+        else:
+            values = self.iter_values(text, settled)
+        for field, value in values:
+            yield field, value, "lm"
+
+    def stream_meal_criteria(self, text: str) -> Iterator[tuple[str, object]]:
+        for field, value, _ in self.stream_meal_criteria_with_sources(text=text):
+            yield field, value
+
+    def extract_meal_criteria_with_sources(self, text: str) -> tuple[ExtractedInfo, dict[str, str]]:
+        values = {}
+        sources = {}
+        for field, value, source in self.stream_meal_criteria_with_sources(text=text):
+            values[field] = value
+            sources[field] = source
+
+        return ExtractedInfo(**values), sources
+
+    def extract_meal_criteria(self, text: str) -> ExtractedInfo:
+        return self.extract_meal_criteria_with_sources(text=text)[0]
+
+    def extract_many(self,
+                     texts: list[str],
+                     max_workers: int | None = None,
+                     ordered: bool = True) -> Iterator[tuple[int, ExtractedInfo | Exception]]:
+        """
+        Extract meal criteria for many prompts, sharing one worker pool across every (prompt, field) call.
+
+        Parameters:
+        - texts: The meal planning prompts
+        - max_workers: Cap on LM calls in flight across all prompts, defaults to the module's max_workers
+        - ordered: Yield results in input order, otherwise as each prompt completes
+
+        Returns:
+        - Iterator of (input index, ExtractedInfo) pairs, with the exception in place of the info for failed prompts
+        """
+        max_workers = max_workers or self.max_workers
+
+        # Extract each distinct prompt once and fan the result out to every index that sent it
+        indexes = {}
+        for index, text in enumerate(texts):
+            indexes.setdefault(normalize_prompt(text), (text, []))[1].append(index)
+        pending = iter(indexes.items())
+
+        # Admit a few prompts per worker at a time so early prompts finish early and memory stays bounded
+        window = max_workers * 2
+        futures = {}
+        values = {}
+        remaining = {}
+        results = {}
+        next_index = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit(key: str, text: str, name: str, **inputs):
+                futures[executor.submit(self.extract_fields, name, text, **inputs)] = (key, text, name)
+
+            def finish(key: str):
+                # Validate a finished prompt and release it from the window
+                result = values.pop(key)
+                if not isinstance(result, Exception):
+                    try:
+                        result = ExtractedInfo(**result)
+                    except ValidationError as e:
+                        result = e
+                for index in indexes[key][1]:
+                    results[index] = result
+
+            def admit():
+                while len(values) < window:
+                    item = next(pending, None)
+                    if item is None:
+                        return
+                    key, (text, _) = item
+                    settled = pre_extract(text) if self.fast_path else {}
+                    values[key] = dict(settled)
+                    remaining[key] = len(ExtractedInfo.model_fields) - len(settled)
+                    if "meal_count" not in settled:
+                        submit(key, text, "meal_count")
+                    for name in PROMPT_FIELDS:
+                        if not is_settled(name, settled):
+                            submit(key, text, name)
+                    for name in MEAL_COUNT_FIELDS:
+                        if not is_settled(name, settled) and "meal_count" in settled:
+                            submit(key, text, name, meal_count=settled["meal_count"])
+                    if remaining[key] == 0:
+                        finish(key)
+
+            admit()
+            while futures or results:
+                if futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key, text, name = futures.pop(future)
+
+                        # Skip the remaining fields of a prompt that already failed
+                        if key not in values:
+                            continue
+                        try:
+                            extracted = future.result()
+                        except Exception as e:
+                            values[key] = e
+                            finish(key)
+                            continue
+
+                        for field, value in extracted.items():
+                            if field not in values[key]:
+                                values[key][field] = value
+                                remaining[key] -= 1
+                        if name == "meal_count":
+                            for dependent in MEAL_COUNT_FIELDS:
+                                if not is_settled(dependent, values[key]):
+                                    submit(key, text, dependent, meal_count=extracted["meal_count"])
+                        if remaining[key] == 0:
+                            finish(key)
+                    admit()
+
+                if ordered:
+                    while next_index in results:
+                        yield next_index, results.pop(next_index)
+                        next_index += 1
+                else:
+                    for index in list(results):
+                        yield index, results.pop(index)
+
+    def forward(self, *, text: str) -> ExtractedInfo:
+        return self.extract_meal_criteria(text=text)
+
+
+# Extract every field with a single predictor, trading per-field accuracy for one LM call per prompt
+class FusedExtractInfoModule(dspy.Module):
+    def __init__(self, metrics: ExtractMetrics | None = None):
+        super().__init__()
+
+        # Latency, token and retry instrumentation for the single call
+        self.metrics = metrics
+
+        # Configure dspy
+        dspy.configure(lm=lm)
+
+        # Add the combined extractor signature
+        self.get_extracted_info = dspy.ChainOfThought(signature=ExtractAllInfo)
+
+        # Load optimized module from file once it has been compiled
+        path = Path("optimized", "extract_fused_optimized.json")
+        if path.exists():
+            self.load(str(path))
 
     def extract_meal_criteria(self, text: str) -> ExtractedInfo:
-        meal_count = self.get_meal_count(meal_plan_prompt=text).meal_count
-
-        # Get the field values by calling each extractor
-        model = ExtractedInfo(
-            meal_count = meal_count,
-            people_per_meal = self.get_people_per_meal(meal_plan_prompt=text, meal_count=meal_count).people_per_meal,
-            meal_types = self.get_meal_types(meal_plan_prompt=text, meal_count=meal_count).meal_types,
-            include_cuisines = self.get_include_cuisines(meal_plan_prompt=text).include_cuisines,
-            exclude_cuisines = self.get_exclude_cuisines(meal_plan_prompt=text).exclude_cuisines,
-            diets = self.get_diets(meal_plan_prompt=text).diets,
-            intolerances = self.get_intolerances(meal_plan_prompt=text).intolerances,
-            include_ingredients = self.get_include_ingredients(meal_plan_prompt=text).include_ingredients,
-            exclude_ingredients = self.get_exclude_ingredients(meal_plan_prompt=text).exclude_ingredients,
-            high_fiber = self.get_high_fiber(meal_plan_prompt=text).high_fiber,
-            high_protein = self.get_high_protein(meal_plan_prompt=text).high_protein,
-            low_calorie = self.get_low_calorie(meal_plan_prompt=text).low_calorie,
-            low_carb = self.get_low_carb(meal_plan_prompt=text).low_carb,
-            low_fat = self.get_low_fat(meal_plan_prompt=text).low_fat,
-            low_cholesterol = self.get_low_cholesterol(meal_plan_prompt=text).low_cholesterol,
-            low_sat_fat = self.get_low_sat_fat(meal_plan_prompt=text).low_sat_fat,
-            low_sodium = self.get_low_sodium(meal_plan_prompt=text).low_sodium
-        )
-
-        return model
+        return call_predictor(self.get_extracted_info, "extracted_info", self.metrics, meal_plan_prompt=text).extracted_info
+
+    def stream_meal_criteria(self, text: str) -> Iterator[tuple[str, object]]:
+        # Every field arrives with the single call
+        yield from self.extract_meal_criteria(text=text).model_dump().items()
 
     def forward(self, *, text: str) -> ExtractedInfo:
         return self.extract_meal_criteria(text=text)
@@ -0,0 +1,40 @@
+import time
+import dspy
+from dspy_data import train_set, dev_set
+from extract_cache import normalize_prompt
+from extract_info import ExtractInfoModule
+from standin_lm import StandInLM
+
+# Repeat the sample prompts to mimic a nightly batch, duplicates included
+prompts = [example.text for example in train_set + dev_set] * 8
+distinct = list({normalize_prompt(p): p for p in prompts}.values())
+latency = 0.05
+server_parallel = 8
+
+# Throughput counts distinct prompts extracted, so runs that skip duplicates are compared like for like
+def run(name: str, extract):
+    standin = StandInLM(latency=latency, max_parallel=server_parallel)
+    dspy.configure(lm=standin)
+    start = time.perf_counter()
+    extract()
+    elapsed = time.perf_counter() - start
+    count = len(distinct)
+    print(f"{name:<32}{count / elapsed:>12.1f}{standin.calls:>10}{elapsed:>10.2f}")
+
+module = ExtractInfoModule()
+print(f"{len(prompts)} prompts ({len(distinct)} distinct), {latency * 1000:.0f} ms per call, {server_parallel} server slots")
+print(f"{'mode':<32}{'distinct/sec':>12}{'calls':>10}{'seconds':>10}")
+
+# One prompt at a time, one field at a time
+module.max_workers = 1
+run("sequential", lambda: [module.extract_meal_criteria(text=p) for p in distinct])
+
+# One prompt at a time, fields concurrent
+module.max_workers = server_parallel
+run("concurrent fields", lambda: [module.extract_meal_criteria(text=p) for p in distinct])
+
+# Shared pool across prompts and fields, on the distinct prompts and on the whole batch with its duplicates
+run("extract_many", lambda: list(module.extract_many(distinct, max_workers=server_parallel)))
+run("extract_many, with duplicates", lambda: list(module.extract_many(prompts, max_workers=server_parallel)))
+module.fast_path = True
+run("extract_many + fast path", lambda: list(module.extract_many(distinct, max_workers=server_parallel)))
@@ -0,0 +1,154 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+from dspy.utils.callback import BaseCallback
+
+# Histogram bucket upper bounds, values above the last bound land in an overflow bucket
+TIME_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+TOKEN_BUCKETS = [32, 64, 128, 256, 512, 1024, 2048, 4096]
+
+
+class Histogram:
+    def __init__(self, bounds: list[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class FieldMetrics:
+    def __init__(self):
+        self.wall_time = Histogram(TIME_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.calls = 0
+        self.retries = 0
+        self.parse_failures = 0
+        self.errors = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "parse_failures": self.parse_failures,
+            "errors": self.errors,
+            "wall_time": self.wall_time.to_dict(),
+            "prompt_tokens": self.prompt_tokens.to_dict(),
+            "completion_tokens": self.completion_tokens.to_dict(),
+        }
+
+
+class PredictorCall:
+    # Counters for one predictor call, filled in by the callbacks on the calling thread
+    def __init__(self):
+        self.lm_calls = 0
+        self.parse_failures = 0
+        self.usage = {}
+
+
+class ExtractMetrics(BaseCallback):
+    """
+    Per-field instrumentation for the extraction predictors.
+
+    Records the wall time, prompt and completion tokens, retries and adapter parse failures of every predictor call.
+    Register it as a DSPy callback and wrap each predictor call in track() with the field name.
+    """
+    def __init__(self):
+        self.fields = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def track(self, field: str) -> Iterator[PredictorCall]:
+        call = PredictorCall()
+        self.local.call = call
+        start = time.perf_counter()
+        error = False
+        try:
+            yield call
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.local.call = None
+            self.record(field, call, elapsed, error)
+
+    def record(self, field: str, call: PredictorCall, elapsed: float, error: bool):
+        # Usage is reported per model, add it up in case a call fell back to another model
+        prompt_tokens = sum(u.get("prompt_tokens") or 0 for u in call.usage.values())
+        completion_tokens = sum(u.get("completion_tokens") or 0 for u in call.usage.values())
+
+        with self.lock:
+            metrics = self.fields.setdefault(field, FieldMetrics())
+            metrics.calls += 1
+            metrics.retries += max(call.lm_calls - 1, 0)
+            metrics.parse_failures += call.parse_failures
+            metrics.errors += error
+            metrics.wall_time.add(elapsed)
+            if call.usage:
+                metrics.prompt_tokens.add(prompt_tokens)
+                metrics.completion_tokens.add(completion_tokens)
+
+    def current(self) -> PredictorCall | None:
+        return getattr(self.local, "call", None)
+
+    def on_lm_end(self, call_id: str, outputs: dict | None, exception: BaseException | None = None):
+        call = self.current()
+        if call is not None:
+            call.lm_calls += 1
+
+    def on_adapter_parse_end(self, call_id: str, outputs: dict | None, exception: BaseException | None = None):
+        call = self.current()
+        if call is not None and exception is not None:
+            call.parse_failures += 1
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {field: metrics.to_dict() for field, metrics in self.fields.items()}
+
+    def table(self) -> list[dict]:
+        # One row per field with the headline numbers, for display
+        rows = []
+        for field, metrics in self.summary().items():
+            rows.append({
+                "field": field,
+                "calls": metrics["calls"],
+                "mean seconds": round(metrics["wall_time"]["mean"], 3),
+                "max seconds": round(metrics["wall_time"]["max"], 3),
+                "mean prompt tokens": round(metrics["prompt_tokens"]["mean"]),
+                "mean completion tokens": round(metrics["completion_tokens"]["mean"]),
+                "retries": metrics["retries"],
+                "parse failures": metrics["parse_failures"],
+                "errors": metrics["errors"],
+            })
+        return rows
+
+    def dump(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def reset(self):
+        with self.lock:
+            self.fields = {}
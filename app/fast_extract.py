@@ -0,0 +1,113 @@
+import re
+
+# Number words accepted in place of digits when counting meals
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "single": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fourteen": 14,
+    "twenty": 20, "twenty-one": 21,
+}
+
+# A count directly followed by a meal, e.g. "5 dinners", "two quick lunches", but not "a meal plan"
+MEAL_COUNT_PATTERN = re.compile(
+    r"\b(\d+|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")\s+"
+    r"(?:[a-z]+(?:-[a-z]+)?\s+)?"
+    r"(meals?|dinners?|lunch(?:es)?|breakfasts?|brunch(?:es)?|suppers?)\b(?!\s*plan)",
+    re.IGNORECASE,
+)
+
+# Mentions of a time span make the meal count a multiplication the rules should not guess at
+TIME_SPAN_PATTERN = re.compile(r"\b(days?|weeks?|weekly|daily|nights?|weekdays?|weekends?)\b", re.IGNORECASE)
+
+# Words before a nutrition target that flip or soften its meaning
+NEGATION_PATTERN = re.compile(r"\b(not|no|don't|doesn't|never|without|isn't|needn't|need not)\b[\w\s-]{0,20}$", re.IGNORECASE)
+
+# Per nutrition flag, a pattern for any mention of the nutrient and a pattern for an explicit request of the target
+NUTRITION_PATTERNS = {
+    "high_fiber": (
+        re.compile(r"fib(?:er|re)", re.IGNORECASE),
+        re.compile(r"high[- ]fib(?:er|re)|high in fib(?:er|re)|fib(?:er|re)[- ]rich|rich in fib(?:er|re)|more fib(?:er|re)", re.IGNORECASE),
+    ),
+    "high_protein": (
+        re.compile(r"protein", re.IGNORECASE),
+        re.compile(r"high[- ]protein|high in protein|protein[- ](?:rich|packed)|rich in protein|more protein", re.IGNORECASE),
+    ),
+    "low_calorie": (
+        re.compile(r"calori|kcal", re.IGNORECASE),
+        re.compile(r"low[- ]calorie|low[- ]cal\b|low in calories|fewer calories|calorie[- ]conscious|reduc\w* (?:my |our |their )?calori", re.IGNORECASE),
+    ),
+    "low_carb": (
+        re.compile(r"carb|keto", re.IGNORECASE),
+        re.compile(r"low[- ]carb|low in carb|fewer carb|reduc\w* (?:my |our |their )?carb|cut\w* (?:back on |down on )?carb", re.IGNORECASE),
+    ),
+    "low_fat": (
+        re.compile(r"(?<!saturated[ -])(?<!sat[ -])\bfat\b|\bfats\b", re.IGNORECASE),
+        re.compile(r"low[- ]fat\b|low in fat\b|fat[- ]free|reduc\w* (?:my |our |their )?fat\b", re.IGNORECASE),
+    ),
+    "low_cholesterol": (
+        re.compile(r"cholesterol", re.IGNORECASE),
+        re.compile(r"low[- ]cholesterol|low in cholesterol|(?:reduc|lower)\w* (?:my |our |their )?cholesterol", re.IGNORECASE),
+    ),
+    "low_sat_fat": (
+        re.compile(r"saturated|sat[- ]fat", re.IGNORECASE),
+        re.compile(r"low[- ]saturated[- ]fat|low in saturated fat|low[- ]sat[- ]fat|(?:reduc|lower)\w* (?:my |our |their )?saturated fat", re.IGNORECASE),
+    ),
+    "low_sodium": (
+        re.compile(r"sodium|salt", re.IGNORECASE),
+        re.compile(r"low[- ]sodium|low in sodium|low[- ]salt|less (?:sodium|salt)|(?:reduc|lower)\w* (?:my |our |their )?(?:sodium|salt)", re.IGNORECASE),
+    ),
+}
+
+
+def parse_number(word: str) -> int:
+    if word.isdigit():
+        return int(word)
+    return NUMBER_WORDS[word.lower()]
+
+
+def pre_extract_meal_count(text: str) -> int | None:
+    # Only settle the count when a single count-and-meal phrase is the whole story
+    if TIME_SPAN_PATTERN.search(text):
+        return None
+    matches = MEAL_COUNT_PATTERN.findall(text)
+    if len(matches) != 1:
+        return None
+    count = parse_number(matches[0][0])
+    return count if count > 0 else None
+
+
+def pre_extract_nutrition(text: str, field: str) -> bool | None:
+    mention, target = NUTRITION_PATTERNS[field]
+
+    # A nutrient that is never mentioned cannot be a target
+    if not mention.search(text):
+        return False
+
+    # An explicit, un-negated request for the target settles it, anything else is left to the LM
+    matches = list(target.finditer(text))
+    if matches and not any(NEGATION_PATTERN.search(text[:m.start()]) for m in matches):
+        return True
+    return None
+
+
+def pre_extract(text: str) -> dict[str, int | bool]:
+    """
+    Settle the fields that deterministic rules can answer confidently.
+
+    Parameters:
+    - text: The meal planning prompt
+
+    Returns:
+    - dict: ExtractedInfo field values keyed by field name, ambiguous fields are omitted
+    """
+    values = {}
+
+    meal_count = pre_extract_meal_count(text)
+    if meal_count is not None:
+        values["meal_count"] = meal_count
+
+    for field in NUTRITION_PATTERNS:
+        value = pre_extract_nutrition(text, field)
+        if value is not None:
+            values[field] = value
+
+    return values
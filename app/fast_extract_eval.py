@@ -0,0 +1,25 @@
+from dspy_data import train_set, dev_set
+from fast_extract import pre_extract, NUTRITION_PATTERNS
+
+# Fields the rule-based fast path can answer
+fields = ["meal_count", *NUTRITION_PATTERNS]
+
+# Measure how often the rules answer each field and how often those answers match the gold output
+def evaluate(name: str, examples: list):
+    print(f"{name} ({len(examples)} prompts)")
+    print(f"{'field':<16}{'hit rate':>10}{'accuracy':>10}")
+    for field in fields:
+        hits = 0
+        correct = 0
+        for example in examples:
+            values = pre_extract(example.text)
+            if field in values:
+                hits += 1
+                if example.output.get(field) == values[field]:
+                    correct += 1
+        accuracy = f"{correct / hits:.2f}" if hits else "-"
+        print(f"{field:<16}{hits / len(examples):>10.2f}{accuracy:>10}")
+    print()
+
+evaluate("dev_set", dev_set)
+evaluate("train_set", train_set)
@@ -1,5 +1,18 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import dspy
-from lm import lm
+from classes import RecipeDetail
+from payload_slimming import slim_recipe
+from lm import lm, num_parallel
+
+# Render results with markdown templates, or set FORMAT_MODE=prose to have the model write them
+format_mode = os.getenv("FORMAT_MODE", "template")
 
 class FormatAsMarkdown(dspy.Signature):
     """
@@ -15,8 +28,28 @@ class FormatAsMarkdown(dspy.Signature):
 
 
 class FormatOutputModule(dspy.Module):
-    def __init__(self):
+    def __init__(self,
+                 max_workers: int = num_parallel,
+                 max_entries: int = 512,
+                 path: Path = Path("cache", "format_cache.sqlite"),
+                 max_stored: int = 10000):
         super().__init__()
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self.max_stored = max_stored
+
+        # Rendered recipes by recipe id and content hash, shared by every session using this module
+        self.rendered = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Rendered recipes are also kept on disk so they survive restarts, least recently used evicted first
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS format_cache (key TEXT PRIMARY KEY, accessed REAL NOT NULL, markdown TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS format_cache_accessed ON format_cache (accessed)")
+        self.db.commit()
 
         # Configure dspy
         dspy.configure(lm=lm)
@@ -30,3 +63,81 @@ class FormatOutputModule(dspy.Module):
         result = self.markdown_formatter(json_object=text).markdown
 
         return result
+
+    def recipe_key(self, recipe: RecipeDetail, text: str) -> str:
+        # The content hash catches a recipe whose details, or the model or instructions rendering it, changed
+        content = f"{lm.model}:{FormatAsMarkdown.instructions}:{text}"
+        return f"{recipe.id}:{hashlib.sha256(content.encode()).hexdigest()}"
+
+    def remember(self, key: str, markdown: str):
+        self.rendered[key] = markdown
+        self.rendered.move_to_end(key)
+        while len(self.rendered) > self.max_entries:
+            self.rendered.popitem(last=False)
+
+    def stored(self, keys: list[str]) -> dict[str, str]:
+        # Look the keys up on disk and mark them as used
+        placeholders = ",".join("?" * len(keys))
+        rows = self.db.execute(f"SELECT key, markdown FROM format_cache WHERE key IN ({placeholders})", keys).fetchall()
+        if rows:
+            self.db.executemany("UPDATE format_cache SET accessed = ? WHERE key = ?", [(time.time(), k) for k, _ in rows])
+            self.db.commit()
+        return dict(rows)
+
+    def store(self, markdown: dict[str, str]):
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR REPLACE INTO format_cache (key, accessed, markdown) VALUES (?, ?, ?)",
+            [(key, now, text) for key, text in markdown.items()]
+        )
+        self.db.execute(
+            "DELETE FROM format_cache WHERE key IN (SELECT key FROM format_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_stored,)
+        )
+        self.db.commit()
+
+    def format_recipes(self, recipes: list[RecipeDetail], max_workers: int | None = None) -> list[str]:
+        """
+        Format many recipes as markdown at once.
+
+        Recipes rendered before are answered from memory or from the cache file, and the rest are formatted
+        concurrently, each distinct recipe once.
+
+        Parameters:
+        - recipes: Recipes to format
+        - max_workers: Most recipes formatted at once, defaults to the module setting
+
+        Returns:
+        - list[str]: Markdown for each recipe, in order
+        """
+        # Send only what the formatter shows, within the token budget
+        texts = [slim_recipe(recipe) for recipe in recipes]
+        keys = [self.recipe_key(recipe, text) for recipe, text in zip(recipes, texts)]
+
+        markdown = {}
+        missing = {}
+        with self.lock:
+            for key, text in zip(keys, texts):
+                if key in self.rendered:
+                    self.rendered.move_to_end(key)
+                    markdown[key] = self.rendered[key]
+                else:
+                    missing[key] = text
+            if missing:
+                for key, text in self.stored(list(missing)).items():
+                    self.remember(key, text)
+                    markdown[key] = text
+                    del missing[key]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+                futures = {key: executor.submit(self.format_as_markdown, text=text) for key, text in missing.items()}
+                for key, future in futures.items():
+                    markdown[key] = future.result()
+
+            with self.lock:
+                for key in missing:
+                    self.remember(key, markdown[key])
+                self.store({key: markdown[key] for key in missing})
+
+        return [markdown[key] for key in keys]
@@ -0,0 +1,154 @@
+import os
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+# Number of hosts kept in each connection pool, and connections kept open per host
+pool_connections = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+pool_maxsize = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+
+# Seconds to wait for a connection and for a response, model calls get a longer read timeout than API calls
+connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+read_timeout = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+lm_read_timeout = float(os.getenv("LM_READ_TIMEOUT", "300"))
+
+# Seconds an idle connection stays open for reuse
+keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened connections of one pooled client.
+
+    Every request that does not open a connection reused a kept-alive one and skipped the TCP/TLS handshake.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def request(self):
+        with self.lock:
+            self.requests += 1
+
+    def connect(self):
+        with self.lock:
+            self.connections += 1
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "reused": reused,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.connections = 0
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    Requests adapter with a fixed pool size, a default timeout and connection counting.
+    """
+    def __init__(self, stats: ConnectionStats, timeout: tuple[float, float], **kwargs):
+        self.stats = stats
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        # Pools that count every connection they open
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                stats.connect()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                stats.connect()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+    def send(self, request, timeout=None, **kwargs):
+        self.stats.request()
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def pooled_session(stats: ConnectionStats, timeout: tuple[float, float] = (connect_timeout, read_timeout)) -> requests.Session:
+    """
+    Create a requests session that keeps connections alive and reuses them across calls.
+
+    Parameters:
+    - stats: Counters the session's requests and new connections are added to
+    - timeout: Connect and read timeout in seconds, used for requests that do not set their own
+
+    Returns:
+    - requests.Session: Session with pooled adapters mounted for http and https
+    """
+    session = requests.Session()
+    adapter = PooledAdapter(stats, timeout, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """
+    Httpx transport that counts requests, and the connections opened for them through the httpcore trace hook.
+    """
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.stats.connect()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.request()
+        request.extensions["trace"] = self.trace
+        return super().handle_request(request)
+
+
+def pooled_client(stats: ConnectionStats, timeout: tuple[float, float] = (connect_timeout, lm_read_timeout)) -> httpx.Client:
+    """
+    Create an httpx client that keeps connections alive and reuses them across calls.
+
+    Parameters:
+    - stats: Counters the client's requests and new connections are added to
+    - timeout: Connect and read timeout in seconds
+
+    Returns:
+    - httpx.Client: Client with a bounded keep-alive connection pool
+    """
+    limits = httpx.Limits(
+        max_connections=pool_maxsize,
+        max_keepalive_connections=pool_maxsize,
+        keepalive_expiry=keepalive_expiry
+    )
+    connect, read = timeout
+    return httpx.Client(
+        transport=CountingTransport(stats, limits=limits),
+        timeout=httpx.Timeout(read, connect=connect)
+    )
+
+
+# Shared clients, the session serves Spoonacular and the ollama management endpoints, the client serves model calls
+session_stats = ConnectionStats()
+session = pooled_session(session_stats)
+lm_client_stats = ConnectionStats()
+lm_client = pooled_client(lm_client_stats)
+
+
+def connection_stats() -> dict:
+    return {"session": session_stats.to_dict(), "lm": lm_client_stats.to_dict()}
@@ -1,8 +1,80 @@
+import os
 import dspy
+from litellm.llms.custom_httpx.http_handler import HTTPHandler
+from http_transport import session, lm_client
+from lm_cache import CachedLM, LMResponseCache, lm_cache_enabled
 
-lm = dspy.LM(
-    model='ollama/gemma3:4b',
-    api_base='http://localhost:11434',
+# Address of the ollama server
+api_base = 'http://localhost:11434'
+
+
+class SharedHTTPHandler(HTTPHandler):
+    # DSPy deep-copies the request arguments of every call, hand out the same handler so the connection pool is shared
+    def __deepcopy__(self, memo: dict):
+        return self
+
+
+# Model calls go through the shared keep-alive client instead of a client litellm creates on its own
+lm_http_handler = SharedHTTPHandler(client=lm_client)
+
+# How long ollama keeps a model loaded after each request, sent with every call so it is never reset to the default
+keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Responses are cached on disk only when LM_CACHE=1, DSPy's own cache stays off
+response_cache = LMResponseCache() if lm_cache_enabled else None
+
+lm = CachedLM(
+    model='ollama_chat/gemma3:4b',
+    api_base=api_base,
+    api_key='',
+    cache=False,
+    keep_alive=keep_alive,
+    client=lm_http_handler,
+    response_cache=response_cache
+)
+
+# Number of requests the ollama server handles at once, match to OLLAMA_NUM_PARALLEL on the server
+num_parallel = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+
+# Smaller model tried first in cascade mode, fields it is not confident about escalate to lm
+small_lm = CachedLM(
+    model='ollama_chat/gemma3:1b',
+    api_base=api_base,
     api_key='',
-    cache=False
+    cache=False,
+    keep_alive=keep_alive,
+    client=lm_http_handler,
+    response_cache=response_cache
 )
+
+
+class ModelResidency:
+    """
+    Keep ollama models loaded between requests.
+
+    warm() loads each model with an empty request so the first real request does not pay the model load time, and
+    release() unloads them again.
+    """
+    def __init__(self, models: list[dspy.LM], api_base: str = api_base, keep_alive: str = keep_alive):
+        self.api_base = api_base
+        self.keep_alive = keep_alive
+        # Ollama knows the models without the litellm provider prefix
+        self.names = [m.model.split("/", 1)[1] for m in models]
+
+    def load(self, name: str, keep_alive: str | int):
+        # An empty prompt loads the model without generating anything
+        response = session.post(f"{self.api_base}/api/generate", json={"model": name, "keep_alive": keep_alive}, timeout=300)
+        response.raise_for_status()
+
+    def warm(self):
+        for name in self.names:
+            self.load(name, self.keep_alive)
+
+    def release(self):
+        for name in self.names:
+            self.load(name, 0)
+
+    def loaded(self) -> list[str]:
+        response = session.get(f"{self.api_base}/api/ps", timeout=10)
+        response.raise_for_status()
+        return [m["name"] for m in response.json().get("models", [])]
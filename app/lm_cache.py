@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import dspy
+from dspy.utils.callback import with_callbacks
+
+# Opt in to caching model responses on disk
+lm_cache_enabled = os.getenv("LM_CACHE") == "1"
+
+# Bump the namespace to invalidate every cached response, for example after changing prompts outside the program
+lm_cache_namespace = os.getenv("LM_CACHE_NAMESPACE", "v1")
+
+# Most responses kept, least recently used are evicted first, and seconds a response stays valid
+lm_cache_max_entries = int(os.getenv("LM_CACHE_MAX_ENTRIES", "10000"))
+lm_cache_ttl = float(os.getenv("LM_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+# Request arguments that do not change the response, left out of the key
+IGNORED_KEY_ARGS = {"api_key", "api_base", "base_url", "client", "keep_alive", "timeout"}
+
+
+class LMResponseCache:
+    """
+    On-disk cache of model responses, keyed by model, prompt or messages and sampling parameters.
+
+    Entries expire after the TTL and the least recently used are evicted beyond max_entries. Every key includes the
+    namespace, so bumping it makes all earlier entries unreachable until compact() removes them.
+    """
+    def __init__(self,
+                 path: Path = Path("cache", "lm_cache.sqlite"),
+                 namespace: str = lm_cache_namespace,
+                 max_entries: int = lm_cache_max_entries,
+                 ttl: float = lm_cache_ttl):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS lm_cache (key TEXT PRIMARY KEY, namespace TEXT NOT NULL, model TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, outputs TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS lm_cache_accessed ON lm_cache (accessed)")
+        self.db.commit()
+
+    def key(self, model: str, prompt: str | None, messages: list[dict] | None, params: dict) -> str:
+        params = {k: v for k, v in params.items() if k not in IGNORED_KEY_ARGS}
+        request = {"model": model, "prompt": prompt, "messages": messages, "params": params}
+        encoded = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.namespace}:{encoded}".encode()).hexdigest()
+
+    def get(self, key: str) -> list | None:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT outputs FROM lm_cache WHERE key = ? AND created > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE lm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            return json.loads(row[0])
+
+    def put(self, key: str, model: str, outputs: list):
+        try:
+            encoded = json.dumps(outputs)
+        except TypeError:
+            # Outputs with objects that do not serialize, such as tool calls, are not cached
+            return
+
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO lm_cache (key, namespace, model, created, accessed, outputs) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.namespace, model, now, now, encoded)
+            )
+            # Evict the least recently used entries beyond the limit
+            self.db.execute(
+                "DELETE FROM lm_cache WHERE key IN (SELECT key FROM lm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self.db.commit()
+
+    def stats(self) -> dict:
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT namespace, model, COUNT(*), SUM(created <= ?), SUM(LENGTH(outputs)) FROM lm_cache "
+                "GROUP BY namespace, model ORDER BY namespace, model",
+                (cutoff,)
+            ).fetchall()
+            return {
+                "path": str(self.path),
+                "namespace": self.namespace,
+                "file_bytes": self.path.stat().st_size if self.path.exists() else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": [
+                    {"namespace": n, "model": m, "entries": count, "expired": expired, "output_bytes": size}
+                    for n, m, count, expired, size in rows
+                ],
+            }
+
+    def compact(self) -> int:
+        # Drop expired entries and entries from other namespaces, then give the space back to the file system
+        with self.lock:
+            deleted = self.db.execute(
+                "DELETE FROM lm_cache WHERE namespace != ? OR created <= ?", (self.namespace, time.time() - self.ttl)
+            ).rowcount
+            self.db.commit()
+            self.db.execute("VACUUM")
+            return deleted
+
+    def purge(self) -> int:
+        with self.lock:
+            deleted = self.db.execute("DELETE FROM lm_cache").rowcount
+            self.db.commit()
+            self.db.execute("VACUUM")
+            return deleted
+
+
+def is_sampled(params: dict) -> bool:
+    # Calls that ask for a fresh sample, such as the cascade's agreement check, must not share one cached answer.
+    # A rollout id names the sample, so it is part of the key and those calls stay cacheable
+    return (params.get("temperature") or 0) > 0 and params.get("rollout_id") is None
+
+
+class CachedLM(dspy.LM):
+    """
+    Language model that answers repeated requests from an LMResponseCache.
+
+    Without a response cache it behaves exactly like dspy.LM. Sampled calls, with a temperature above zero and no
+    rollout id, always go to the model. Callbacks run for cached answers as well, but cached answers add no token
+    usage and no history entry.
+    """
+    def __init__(self, *args, response_cache: LMResponseCache | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.response_cache = response_cache
+
+    @with_callbacks
+    def __call__(self, prompt: str | None = None, *, messages: list[dict] | None = None, **kwargs):
+        params = {**self.kwargs, **kwargs}
+        if self.response_cache is None or is_sampled(params):
+            return dspy.LM.__call__.__wrapped__(self, prompt, messages=messages, **kwargs)
+
+        key = self.response_cache.key(self.model, prompt, messages, params)
+        outputs = self.response_cache.get(key)
+        if outputs is None:
+            outputs = dspy.LM.__call__.__wrapped__(self, prompt, messages=messages, **kwargs)
+            self.response_cache.put(key, self.model, outputs)
+        return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and maintain the on-disk model response cache")
+    parser.add_argument("command", choices=["stats", "compact", "purge"])
+    parser.add_argument("--path", type=Path, default=Path("cache", "lm_cache.sqlite"))
+    args = parser.parse_args()
+
+    cache = LMResponseCache(path=args.path)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=4))
+    elif args.command == "compact":
+        print(f"Removed {cache.compact()} expired or stale entries")
+    else:
+        print(f"Removed {cache.purge()} entries")
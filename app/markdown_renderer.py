@@ -0,0 +1,138 @@
+import html
+import re
+from classes import *
+
+# Display labels of the nutrition flags
+NUTRITION_LABELS = {
+    "high_fiber": "High fiber",
+    "high_protein": "High protein",
+    "low_calorie": "Low calorie",
+    "low_carb": "Low carb",
+    "low_fat": "Low fat",
+    "low_cholesterol": "Low cholesterol",
+    "low_sat_fat": "Low saturated fat",
+    "low_sodium": "Low sodium",
+}
+
+# Shown in place of the recipes of a search that found none
+NO_RESULTS = "_No recipes matched these criteria._"
+
+# Nutrients shown in a recipe's nutrition table, in order
+NUTRITION_TABLE = ["Calories", "Protein", "Fat", "Saturated Fat", "Carbohydrates", "Fiber", "Cholesterol", "Sodium"]
+
+
+def plain_text(text: str) -> str:
+    # Spoonacular summaries and instructions are HTML, keep list items on their own lines and drop the other tags
+    text = re.sub(r"<li[^>]*>", "\n", text)
+    text = re.sub(r"<br\s*/?>|</p>", "\n", text)
+    text = html.unescape(re.sub(r"<[^>]+>", "", text))
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def bullet(label: str, values: list) -> str | None:
+    if not values:
+        return None
+    return f"- **{label}:** {', '.join(str(v) for v in values)}"
+
+
+def render_extracted_info(info: ExtractedInfo) -> str:
+    """
+    Render extracted meal criteria as markdown, leaving out empty criteria.
+
+    Parameters:
+    - info: Extracted meal criteria
+
+    Returns:
+    - str: Markdown with one bullet per criterion
+    """
+    people = "person" if info.people_per_meal == 1 else "people"
+    meals = "meal" if info.meal_count == 1 else "meals"
+    lines = [
+        "## Meal plan criteria",
+        f"- **Meals:** {info.meal_count} {meals} for {info.people_per_meal} {people}",
+        bullet("Meal types", info.meal_types),
+        bullet("Cuisines", info.include_cuisines),
+        bullet("Avoid cuisines", info.exclude_cuisines),
+        bullet("Diets", info.diets),
+        bullet("Intolerances", info.intolerances),
+        bullet("Include ingredients", info.include_ingredients),
+        bullet("Exclude ingredients", info.exclude_ingredients),
+        bullet("Nutrition targets", [label for field, label in NUTRITION_LABELS.items() if getattr(info, field)]),
+    ]
+    return "\n".join(line for line in lines if line)
+
+
+def ingredient_line(ingredient: ExtendedIngredient) -> str:
+    if ingredient.original:
+        return f"- {ingredient.original}"
+    amount = f"{ingredient.amount:g} " if ingredient.amount is not None else ""
+    unit = f"{ingredient.unit} " if ingredient.unit else ""
+    return f"- {amount}{unit}{ingredient.name or ''}".rstrip()
+
+
+def nutrition_table(nutrition: RecipeNutrition | None) -> list[str]:
+    nutrients = {n.name: n for n in (nutrition.nutrients or []) if n.amount is not None} if nutrition else {}
+    rows = [f"| {name} | {nutrients[name].amount:g} {nutrients[name].unit or ''} |" for name in NUTRITION_TABLE if name in nutrients]
+    if not rows:
+        return []
+    return ["#### Nutrition per serving", "| Nutrient | Amount |", "| --- | --- |", *rows]
+
+
+def render_recipe(recipe: RecipeDetail) -> str:
+    """
+    Render a recipe as markdown with a section for each part of the recipe that is present.
+
+    Parameters:
+    - recipe: Spoonacular recipe
+
+    Returns:
+    - str: Markdown with the title, facts, summary, ingredients, instructions, nutrition and source
+    """
+    sections = [f"### {recipe.title or 'Untitled recipe'}"]
+    if recipe.image:
+        sections.append(f"![{recipe.title or 'Recipe'}]({recipe.image})")
+
+    facts = [
+        f"Ready in {recipe.readyInMinutes} minutes" if recipe.readyInMinutes else None,
+        f"Serves {recipe.servings}" if recipe.servings else None,
+        f"Health score {recipe.healthScore:g}" if recipe.healthScore is not None else None,
+    ]
+    facts = [f for f in facts if f]
+    if facts:
+        sections.append(" · ".join(facts))
+
+    tags = [*(recipe.cuisines or []), *(recipe.diets or []), *(recipe.dishTypes or [])]
+    if tags:
+        sections.append(" ".join(f"`{tag}`" for tag in dict.fromkeys(tags)))
+    if recipe.summary:
+        sections.append(plain_text(recipe.summary))
+
+    if recipe.extendedIngredients:
+        sections.append("\n".join(["#### Ingredients", *(ingredient_line(i) for i in recipe.extendedIngredients)]))
+    if recipe.instructions:
+        steps = plain_text(recipe.instructions).splitlines()
+        sections.append("\n".join(["#### Instructions", *(f"{i}. {step}" for i, step in enumerate(steps, 1))]))
+
+    table = nutrition_table(recipe.nutrition)
+    if table:
+        sections.append("\n".join(table))
+    if recipe.winePairing and recipe.winePairing.pairingText:
+        sections.append(f"#### Wine pairing\n{recipe.winePairing.pairingText}")
+    if recipe.sourceUrl:
+        sections.append(f"[{recipe.sourceName or 'Source'}]({recipe.sourceUrl})")
+    return "\n\n".join(sections)
+
+
+def render_search_response(response: SearchRecipesResponse) -> str:
+    """
+    Render every recipe of a search response as markdown.
+
+    Parameters:
+    - response: Spoonacular search response
+
+    Returns:
+    - str: Markdown with the recipes separated by rules
+    """
+    if not response.results:
+        return NO_RESULTS
+    return "\n\n---\n\n".join(render_recipe(r) for r in response.results)
@@ -0,0 +1,84 @@
+import threading
+import numpy as np
+from classes import *
+
+# One column per nutrient a search request can constrain
+NUTRIENT_COLUMNS = sorted({name for name, _ in NUTRIENT_PARAMS.values()})
+
+
+class NutrientIndex:
+    """
+    Columnar nutrient amounts of every indexed recipe, one row per recipe and one column per nutrient.
+
+    Any combination of the min/max nutrition parameters of a search request is answered with vectorized masks over
+    the columns. Missing amounts are stored as NaN and never satisfy a bound, like the per-recipe filter.
+    """
+    def __init__(self, columns: list[str] = NUTRIENT_COLUMNS, capacity: int = 1024):
+        self.columns = {name: j for j, name in enumerate(columns)}
+        # Column-major, so each nutrient is contiguous in memory
+        self.values = np.full((len(columns), capacity), np.nan)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.rows = {}
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def grow(self, needed: int):
+        # Double the capacity, so appending stays amortized constant time
+        capacity = self.ids.shape[0]
+        while capacity < needed:
+            capacity *= 2
+        values = np.full((len(self.columns), capacity), np.nan)
+        values[:, :self.size] = self.values[:, :self.size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self.ids[:self.size]
+        self.values, self.ids = values, ids
+
+    def add(self, recipes: list[RecipeDetail]):
+        recipes = [r for r in recipes if r.id is not None]
+        with self.lock:
+            if self.size + len(recipes) > self.ids.shape[0]:
+                self.grow(self.size + len(recipes))
+            for recipe in recipes:
+                # A recipe seen again overwrites its row
+                row = self.rows.get(recipe.id)
+                if row is None:
+                    row = self.rows[recipe.id] = self.size
+                    self.size += 1
+                self.ids[row] = recipe.id
+                self.values[:, row] = np.nan
+                nutrients = (recipe.nutrition.nutrients or []) if recipe.nutrition is not None else []
+                for nutrient in nutrients:
+                    j = self.columns.get(nutrient.name)
+                    if j is not None and nutrient.amount is not None:
+                        self.values[j, row] = nutrient.amount
+
+    def mask(self, request: SearchRecipesRequest) -> np.ndarray:
+        # Rows that satisfy every nutrition parameter set on the request
+        mask = np.ones(self.size, dtype=bool)
+        for param, (name, bound) in NUTRIENT_PARAMS.items():
+            limit = getattr(request, param)
+            if limit is None:
+                continue
+            column = self.values[self.columns[name], :self.size]
+            mask &= column >= limit if bound == "min" else column <= limit
+        return mask
+
+    def filter(self, request: SearchRecipesRequest) -> np.ndarray:
+        """
+        Find the recipes meeting the nutrition parameters of a search request.
+
+        Parameters:
+        - request: Spoonacular search request, only its nutrition parameters are applied
+
+        Returns:
+        - np.ndarray: Ids of the matching recipes
+        """
+        with self.lock:
+            return self.ids[:self.size][self.mask(request)]
+
+
+def has_nutrient_limits(request: SearchRecipesRequest) -> bool:
+    return any(getattr(request, param) is not None for param in NUTRIENT_PARAMS)
@@ -0,0 +1,74 @@
+import random
+import time
+from classes import *
+from nutrient_index import NutrientIndex, NUTRIENT_COLUMNS
+from recipe_store import nutrient_amount
+
+# Typical per-serving ranges of each nutrient, some recipes are missing a nutrient altogether
+RANGES = {
+    "Calories": (80, 1200),
+    "Carbohydrates": (0, 150),
+    "Cholesterol": (0, 400),
+    "Fat": (0, 80),
+    "Fiber": (0, 20),
+    "Protein": (0, 80),
+    "Saturated Fat": (0, 30),
+    "Sodium": (20, 2500),
+}
+
+def make_recipes(count: int) -> list[RecipeDetail]:
+    random.seed(1)
+    recipes = []
+    for i in range(count):
+        nutrients = [
+            Nutrient(name=name, amount=round(random.uniform(*RANGES[name]), 1), unit="g")
+            for name in NUTRIENT_COLUMNS if random.random() > 0.02
+        ]
+        recipes.append(RecipeDetail(id=i, title=f"Recipe {i}", nutrition=RecipeNutrition(nutrients=nutrients)))
+    return recipes
+
+# The per-recipe filter the local store used before the index
+def python_filter(recipes: list[RecipeDetail], request: SearchRecipesRequest) -> list[int]:
+    found = []
+    for recipe in recipes:
+        for param, (name, bound) in NUTRIENT_PARAMS.items():
+            limit = getattr(request, param)
+            if limit is None:
+                continue
+            amount = nutrient_amount(recipe, name)
+            if amount is None or (bound == "min" and amount < limit) or (bound == "max" and amount > limit):
+                break
+        else:
+            found.append(recipe.id)
+    return found
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+requests = {
+    "high protein": SearchRecipesRequest(minProtein=Nutrition.HIGH_PROTEIN),
+    "low sodium, low fat": SearchRecipesRequest(maxSodium=Nutrition.LOW_SODIUM, maxFat=Nutrition.LOW_FAT),
+    "all eight targets": SearchRecipesRequest(
+        minFiber=Nutrition.HIGH_FIBER, minProtein=Nutrition.HIGH_PROTEIN, maxCalories=Nutrition.LOW_CALORIE,
+        maxCarbs=Nutrition.LOW_CARB, maxFat=Nutrition.LOW_FAT, maxCholesterol=Nutrition.LOW_CHOLESTEROL,
+        maxSaturatedFat=Nutrition.LOW_SATURATED_FAT, maxSodium=Nutrition.LOW_SODIUM
+    ),
+}
+
+recipes = make_recipes(100_000)
+start = time.perf_counter()
+index = NutrientIndex()
+index.add(recipes)
+print(f"{len(recipes)} recipes, index built in {time.perf_counter() - start:.2f} s")
+print(f"{'constraints':<22}{'matches':>9}{'python ms':>12}{'numpy ms':>11}{'speedup':>10}")
+for name, request in requests.items():
+    expected = python_filter(recipes, request)
+    assert index.filter(request).tolist() == expected
+    python_time = best_of(lambda: python_filter(recipes, request), 3)
+    numpy_time = best_of(lambda: index.filter(request), 50)
+    print(f"{name:<22}{len(expected):>9}{python_time * 1000:>12.1f}{numpy_time * 1000:>11.3f}{python_time / numpy_time:>9.0f}x")
@@ -0,0 +1,107 @@
+import json
+import math
+import os
+from classes import RecipeDetail
+from markdown_renderer import NUTRITION_TABLE, plain_text
+
+# Prompt tokens a recipe payload may use, set FORMATTER_TOKEN_BUDGET to change
+formatter_token_budget = int(os.getenv("FORMATTER_TOKEN_BUDGET", "1024"))
+
+# Rough size of a token in JSON and English text, good enough to budget without a tokenizer for the model
+CHARS_PER_TOKEN = 4
+
+# Recipe fields the formatter never shows
+DROPPED_RECIPE_FIELDS = {
+    "id", "image", "imageType", "license", "creditsText", "spoonacularSourceUrl", "gaps", "weightWatcherSmartPoints",
+    "spoonacularScore", "cheap", "sustainable", "veryPopular", "pricePerServing",
+}
+
+# Ingredient fields the formatter never shows, the original line already holds the amount and unit
+KEPT_INGREDIENT_FIELDS = {"original", "name"}
+
+# Text fields shortened, longest first, when the payload is over budget
+TRUNCATED_FIELDS = ["summary", "instructions"]
+
+# Shortest a truncated text field becomes
+MIN_TEXT_TOKENS = 32
+
+# Appended where a text field was cut, counted toward the field's share of the budget
+TRUNCATION_MARKER = " …"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def strip_empty(value):
+    # Drop nulls, empty strings and empty lists and objects at every level
+    if isinstance(value, dict):
+        value = {k: strip_empty(v) for k, v in value.items()}
+        return {k: v for k, v in value.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        value = [strip_empty(v) for v in value]
+        return [v for v in value if v not in (None, "", [], {})]
+    return value
+
+
+def project_recipe(recipe: RecipeDetail) -> dict:
+    # Keep only what the formatter shows, as plain text
+    data = recipe.model_dump(exclude=DROPPED_RECIPE_FIELDS)
+    for field in TRUNCATED_FIELDS:
+        if data.get(field):
+            data[field] = plain_text(data[field])
+    data["extendedIngredients"] = [
+        {k: v for k, v in (i or {}).items() if k in KEPT_INGREDIENT_FIELDS} for i in data.get("extendedIngredients") or []
+    ]
+    if data.get("winePairing"):
+        data["winePairing"].pop("productMatches", None)
+    if data.get("nutrition"):
+        nutrients = {n["name"]: n for n in data["nutrition"].get("nutrients") or []}
+        data["nutrition"] = [
+            {"name": name, "amount": nutrients[name]["amount"], "unit": nutrients[name]["unit"]}
+            for name in NUTRITION_TABLE if name in nutrients
+        ]
+    return strip_empty(data)
+
+
+def encode(data: dict) -> str:
+    # Keep non-ASCII text as is, escaping it would grow every character to six
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def truncate_words(text: str, tokens: int) -> str:
+    # Cut at a word boundary and mark the cut, leaving room for the marker
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit - len(TRUNCATION_MARKER)].rsplit(" ", 1)[0] + TRUNCATION_MARKER
+
+
+def slim_recipe(recipe: RecipeDetail, budget: int = formatter_token_budget) -> str:
+    """
+    Shrink a recipe to the JSON payload the formatter needs, within a token budget.
+
+    Nulls, empty values and fields the formatter never shows are removed, HTML is reduced to text, and the longest
+    text field is shortened until the payload fits the budget or every text field is at its minimum.
+
+    Parameters:
+    - recipe: Recipe to send to the formatter
+    - budget: Estimated prompt tokens the payload may use
+
+    Returns:
+    - str: Compact JSON payload
+    """
+    data = project_recipe(recipe)
+    payload = encode(data)
+    while estimate_tokens(payload) > budget:
+        fields = [f for f in TRUNCATED_FIELDS if estimate_tokens(data.get(f, "")) > MIN_TEXT_TOKENS]
+        if not fields:
+            break
+        longest = max(fields, key=lambda f: len(data[f]))
+        overflow = estimate_tokens(payload) - budget
+        shortened = truncate_words(data[longest], max(estimate_tokens(data[longest]) - overflow, MIN_TEXT_TOKENS))
+        if len(shortened) >= len(data[longest]):
+            break
+        data[longest] = shortened
+        payload = encode(data)
+    return payload
@@ -0,0 +1,74 @@
+import json
+import random
+import sqlite3
+from pathlib import Path
+from classes import *
+from payload_slimming import estimate_tokens, slim_recipe, formatter_token_budget
+
+WORDS = "simmer the sauce with garlic and fresh herbs until thick then fold in the roasted vegetables and serve warm".split()
+
+def sentence(count: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(count)).capitalize() + "."
+
+# Recipes shaped like complexSearch results with instructions and nutrition, for when no recipes are stored yet
+def sample_recipes(count: int) -> list[RecipeDetail]:
+    random.seed(1)
+    recipes = []
+    for i in range(count):
+        ingredients = [
+            ExtendedIngredient(
+                aisle="Produce", amount=2.0, consistency="solid", id=1000 + k, image=f"ingredient-{k}.png",
+                measures=Measures(
+                    us=UnitMeasure(amount=2.0, unitLong="cups", unitShort="c"),
+                    metric=UnitMeasure(amount=473.0, unitLong="milliliters", unitShort="ml")
+                ),
+                meta=["fresh", "chopped"], name=f"ingredient {k}", original=f"2 cups ingredient {k}, chopped",
+                originalName=f"ingredient {k}, chopped", unit="cups"
+            )
+            for k in range(random.randint(6, 16))
+        ]
+        nutrients = [
+            Nutrient(name=name, amount=round(random.uniform(1, 500), 2), unit="g", percentOfDailyNeeds=12.5)
+            for name in ["Calories", "Fat", "Saturated Fat", "Carbohydrates", "Net Carbohydrates", "Sugar",
+                         "Cholesterol", "Sodium", "Protein", "Fiber", "Vitamin C", "Iron", "Calcium", "Potassium",
+                         "Magnesium", "Vitamin A", "Vitamin B6", "Folate", "Zinc", "Phosphorus"]
+        ]
+        recipes.append(RecipeDetail(
+            id=i, title=f"Sample recipe {i}", image=f"https://img.spoonacular.com/recipes/{i}-556x370.jpg",
+            imageType="jpg", servings=4, readyInMinutes=45, license="CC BY 3.0", sourceName="Sample Kitchen",
+            sourceUrl=f"https://example.com/recipe-{i}", spoonacularSourceUrl=f"https://spoonacular.com/recipe-{i}",
+            healthScore=42.0, spoonacularScore=88.1, pricePerServing=312.5, cheap=False, creditsText="Sample Kitchen",
+            cuisines=["Mediterranean"], dairyFree=True, diets=["gluten free"], gaps="no", glutenFree=True,
+            instructions="<ol>" + "".join(f"<li>{sentence(random.randint(10, 40))}</li>" for _ in range(random.randint(4, 12))) + "</ol>",
+            dishTypes=["main course", "dinner"], extendedIngredients=ingredients,
+            summary="<b>" + " ".join(sentence(random.randint(12, 30)) for _ in range(random.randint(3, 8))) + "</b>",
+            winePairing=WinePairing(
+                pairedWines=["merlot"], pairingText=sentence(25),
+                productMatches=[ProductMatch(id=1, title="Sample Merlot", description=sentence(40), price="$14.99",
+                                             imageUrl="https://example.com/wine.jpg", averageRating=0.9,
+                                             ratingCount=12.0, score=0.85, link="https://example.com/wine")]
+            ),
+            nutrition=RecipeNutrition(nutrients=nutrients)
+        ))
+    return recipes
+
+# Prefer the recipes the local store has collected from real searches
+def stored_recipes(path: Path = Path("cache", "recipe_store.sqlite"), limit: int = 20) -> list[RecipeDetail]:
+    if not path.exists():
+        return []
+    with sqlite3.connect(path) as db:
+        rows = db.execute("SELECT recipe FROM recipes LIMIT ?", (limit,)).fetchall()
+    return [RecipeDetail.model_validate_json(recipe) for (recipe,) in rows]
+
+recipes = stored_recipes() or sample_recipes(20)
+print(f"Token budget {formatter_token_budget}, estimated tokens per recipe payload")
+print(f"{'recipe':<28}{'before':>8}{'after':>8}{'saved':>8}")
+total_before = total_after = 0
+for recipe in recipes:
+    # The payload the app sent before slimming
+    before = estimate_tokens(json.dumps(recipe.model_dump()))
+    after = estimate_tokens(slim_recipe(recipe))
+    total_before += before
+    total_after += after
+    print(f"{(recipe.title or '')[:27]:<28}{before:>8}{after:>8}{1 - after / before:>8.0%}")
+print(f"{'total':<28}{total_before:>8}{total_after:>8}{1 - total_after / total_before:>8.0%}")
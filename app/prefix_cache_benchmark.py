@@ -0,0 +1,79 @@
+import json
+import os
+import time
+from http_transport import session
+import dspy
+from dspy_data import dev_set
+from extract_info import ExtractInfoModule, MEAL_COUNT_FIELDS, PROMPT_FIELDS
+from lm import lm, api_base, keep_alive, ModelResidency
+from payload_slimming import estimate_tokens
+from prompt_layout import SharedPrefixAdapter
+
+model_name = lm.model.split("/", 1)[1]
+residency = ModelResidency(models=[lm])
+module = ExtractInfoModule()
+names = ["meal_count", *MEAL_COUNT_FIELDS, *PROMPT_FIELDS]
+
+# Time to the first generated token, and the prompt tokens ollama had to evaluate rather than reuse from its cache
+def first_token(messages: list[dict]) -> tuple[float, int]:
+    body = {"model": model_name, "messages": messages, "stream": True, "keep_alive": keep_alive, "options": {"num_predict": 1}}
+    start = time.perf_counter()
+    ttft = None
+    with session.post(f"{api_base}/api/chat", json=body, stream=True, timeout=300) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if chunk.get("done"):
+                return ttft, chunk.get("prompt_eval_count", 0)
+    return ttft, 0
+
+def extractor_messages(adapter: dspy.ChatAdapter, text: str, meal_count: int) -> list[list[dict]]:
+    # Every extractor prompt for one meal planning request, in the order the module calls them
+    prompts = []
+    for predictor_name in names:
+        predict = getattr(module, f"get_{predictor_name}").predict
+        inputs = {"meal_plan_prompt": text}
+        if predictor_name in MEAL_COUNT_FIELDS:
+            inputs["meal_count"] = meal_count
+        prompts.append(adapter.format(predict.signature, predict.demos, inputs))
+    return prompts
+
+# Estimated prompt tokens per extractor call, and how many of them every extractor of a request shares
+def layout_tokens(name: str, adapter: dspy.ChatAdapter):
+    total = []
+    shared = []
+    for example in dev_set:
+        texts = ["".join(f"<{m['role']}>{m['content']}" for m in messages)
+                 for messages in extractor_messages(adapter, example.text, example.output["meal_count"])]
+        total.extend(estimate_tokens(text) for text in texts)
+        shared.append(estimate_tokens(os.path.commonprefix(texts)))
+    print(f"{name:<36}{sum(total) / len(total):>14.0f}{sum(shared) / len(shared):>14.0f}")
+
+# Send every extractor prompt for each dev prompt in the order the module calls them
+def run(name: str, adapter: dspy.ChatAdapter, cold: bool):
+    times = []
+    tokens = []
+    for example in dev_set:
+        if cold:
+            residency.release()
+        for messages in extractor_messages(adapter, example.text, example.output["meal_count"]):
+            ttft, evaluated = first_token(messages)
+            times.append(ttft)
+            tokens.append(evaluated)
+    first = times[::len(names)]
+    print(f"{name:<36}{sum(first) / len(first):>14.3f}{sum(times) / len(times):>12.3f}{sum(tokens) / len(tokens):>16.0f}")
+
+print(f"{model_name}, {len(dev_set)} prompts x {len(names)} extractors")
+print(f"{'layout':<36}{'tokens/call':>14}{'shared prefix':>14}")
+layout_tokens("field first", dspy.ChatAdapter())
+layout_tokens("shared prefix first", SharedPrefixAdapter())
+print()
+print(f"{'layout':<36}{'first TTFT s':>14}{'mean TTFT s':>12}{'prompt tokens':>16}")
+run("field first, cold model", dspy.ChatAdapter(), cold=True)
+residency.warm()
+run("field first, warm model", dspy.ChatAdapter(), cold=False)
+run("shared prefix first, warm model", SharedPrefixAdapter(), cold=False)
@@ -0,0 +1,57 @@
+import textwrap
+import dspy
+
+# Instructions every extractor shares, sent ahead of the field-specific prompt
+SHARED_INSTRUCTIONS = """You are an information-extraction specialist. Always:
+- Read the entire input carefully
+- Extract only the fields and information requested
+- Answer only the question asked after the meal planning request"""
+
+
+class SharedPrefixAdapter(dspy.ChatAdapter):
+    """
+    Chat adapter that starts every prompt with the text all extractors share.
+
+    The shared instructions and the user's meal planning request come first and only once, followed by the
+    field-specific instructions and output format, so the model server can reuse the cached prefix across the
+    extractors of one request. Predictors with demos keep the request in the final turn, laid out like their demos,
+    and share only the instructions. Responses are parsed exactly as the chat adapter does.
+    """
+    def __init__(self, shared_input: str = "meal_plan_prompt", instructions: str = SHARED_INSTRUCTIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.shared_input = shared_input
+        self.instructions = instructions
+
+    def task_description(self, signature: type[dspy.Signature]) -> str:
+        # The signature's own instructions, without the lines the shared instructions already give
+        shared = {line.strip() for line in self.instructions.splitlines()}
+        lines = [line for line in textwrap.dedent(signature.instructions).splitlines() if line.strip() not in shared]
+        objective = ("\n" + " " * 8).join([""] + lines)
+        return f"In adhering to this structure, your objective is: {objective}"
+
+    def field_description(self, signature: type[dspy.Signature]) -> str:
+        return (
+            f"{self.format_field_description(signature)}\n"
+            f"{self.format_field_structure(signature)}\n"
+            f"{self.task_description(signature)}"
+        )
+
+    def format(self, signature: type[dspy.Signature], demos: list[dict], inputs: dict) -> list[dict]:
+        if self.shared_input not in inputs:
+            return super().format(signature, demos, inputs)
+
+        # Demos carry their own request in every turn, so the live request goes in the final turn the same way and
+        # only the shared instructions are shared
+        if demos:
+            _, *turns = super().format(signature, demos, inputs)
+            return [{"role": "system", "content": f"{self.instructions}\n\n{self.field_description(signature)}"}, *turns]
+
+        # The shared request is sent once in the prefix, and the task turn carries the field's instructions and its
+        # other inputs
+        field_inputs = {k: v for k, v in inputs.items() if k != self.shared_input}
+        _, task = super().format(signature, demos, field_inputs)
+        shared = f"{self.instructions}\n\n[[ ## {self.shared_input} ## ]]\n{inputs[self.shared_input]}"
+        return [
+            {"role": "system", "content": shared},
+            {"role": "user", "content": f"{self.field_description(signature)}\n\n{task['content']}"},
+        ]
@@ -0,0 +1,309 @@
+import bisect
+import random
+import sqlite3
+import threading
+from collections import defaultdict
+from pathlib import Path
+from classes import *
+from nutrient_index import NutrientIndex, has_nutrient_limits
+
+# Ingredients that rule a recipe out for each intolerance, matched as substrings of ingredient names
+INTOLERANCE_INGREDIENTS = {
+    "Dairy": ["milk", "cheese", "butter", "cream", "yogurt", "whey", "casein", "ghee", "lactose", "parmesan",
+              "mozzarella", "cheddar", "ricotta", "feta"],
+    "Egg": ["egg", "mayonnaise", "meringue"],
+    "Gluten": ["wheat", "flour", "barley", "rye", "bread", "pasta", "couscous", "semolina", "seitan", "soy sauce",
+               "beer", "panko", "noodle", "tortilla", "cracker"],
+    "Grain": ["wheat", "flour", "rice", "oat", "corn", "barley", "rye", "quinoa", "millet", "bread", "pasta",
+              "couscous", "noodle", "tortilla", "cereal", "bulgur"],
+    "Peanut": ["peanut"],
+    "Seafood": ["fish", "salmon", "tuna", "cod", "anchov", "sardine", "tilapia", "halibut", "trout", "mackerel",
+                "shrimp", "prawn", "crab", "lobster", "clam", "mussel", "oyster", "scallop", "squid"],
+    "Sesame": ["sesame", "tahini"],
+    "Shellfish": ["shrimp", "prawn", "crab", "lobster", "clam", "mussel", "oyster", "scallop", "crawfish"],
+    "Soy": ["soy", "tofu", "edamame", "miso", "tempeh", "tamari"],
+    "Sulfite": ["wine", "vinegar", "dried", "molasses"],
+    "Tree Nut": ["almond", "cashew", "walnut", "pecan", "pistachio", "hazelnut", "macadamia", "brazil nut",
+                 "pine nut", "nutella"],
+    "Wheat": ["wheat", "flour", "bread", "pasta", "couscous", "semolina", "seitan", "bulgur", "panko", "noodle",
+              "tortilla", "cracker"],
+}
+
+# Recipe flags that must also be set for an intolerance
+INTOLERANCE_FLAGS = {"Dairy": "dairyFree", "Gluten": "glutenFree"}
+
+# Spoonacular diet labels and recipe flags that satisfy each diet
+DIET_LABELS = {
+    "gluten free": ({"gluten free"}, "glutenFree"),
+    "ketogenic": ({"ketogenic"}, "ketogenic"),
+    "vegetarian": ({"lacto ovo vegetarian", "vegetarian", "vegan"}, "vegetarian"),
+    "lacto vegetarian": ({"lacto vegetarian", "vegan"}, None),
+    "ovo vegetarian": ({"ovo vegetarian", "vegan"}, None),
+    "vegan": ({"vegan"}, "vegan"),
+    "pescatarian": ({"pescatarian", "lacto ovo vegetarian", "vegan"}, None),
+    "paleo": ({"paleolithic", "paleo"}, None),
+    "primal": ({"primal"}, None),
+    "low fodmap": ({"fodmap friendly", "low fodmap"}, "lowFodmap"),
+    "whole30": ({"whole 30", "whole30"}, "whole30"),
+}
+
+# Local matches needed per requested recipe before the store answers instead of Spoonacular, so answers still vary
+LOCAL_POOL_FACTOR = 3
+
+
+def ingredient_names(recipe: RecipeDetail) -> list[str]:
+    return [(i.name or "").lower() for i in recipe.extendedIngredients or []]
+
+
+def nutrient_amount(recipe: RecipeDetail, name: str) -> float | None:
+    if recipe.nutrition is None:
+        return None
+    for nutrient in recipe.nutrition.nutrients or []:
+        if nutrient.name == name:
+            return nutrient.amount
+    return None
+
+
+def matches(recipe: RecipeDetail, request: SearchRecipesRequest) -> bool:
+    # Apply the locally checkable constraints of the request to one fetched recipe
+    if request.minServings is not None and (recipe.servings or 0) < request.minServings:
+        return False
+    cuisines = recipe.cuisines or []
+    if request.cuisine and not set(request.cuisine) & set(cuisines):
+        return False
+    if request.excludeCuisine and set(request.excludeCuisine) & set(cuisines):
+        return False
+    names = ingredient_names(recipe)
+    for ingredient in request.includeIngredients or []:
+        if not any(ingredient.lower() in name for name in names):
+            return False
+    for ingredient in request.excludeIngredients or []:
+        if any(ingredient.lower() in name for name in names):
+            return False
+    for param, (name, bound) in NUTRIENT_PARAMS.items():
+        limit = getattr(request, param)
+        if limit is None:
+            continue
+        amount = nutrient_amount(recipe, name)
+        if amount is None or (bound == "min" and amount < limit) or (bound == "max" and amount > limit):
+            return False
+    return True
+
+
+def is_free_of(recipe: RecipeDetail, intolerance: str) -> bool:
+    # Only a sanity check on top of Spoonacular's own intolerance filter, a short word list cannot prove a recipe safe.
+    # Without an ingredient list nothing can be ruled out, so the recipe is not considered safe
+    names = ingredient_names(recipe)
+    if not names:
+        return False
+    flag = INTOLERANCE_FLAGS.get(intolerance)
+    if flag is not None and not getattr(recipe, flag):
+        return False
+    return not any(word in name for word in INTOLERANCE_INGREDIENTS[intolerance] for name in names)
+
+
+def fits_diet(recipe: RecipeDetail, diet: str) -> bool:
+    labels, flag = DIET_LABELS[diet]
+    return bool(labels & set(recipe.diets or [])) or (flag is not None and getattr(recipe, flag) is True)
+
+
+def remove_sorted(entries: list, entry: tuple):
+    i = bisect.bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+class RecipeStore:
+    """
+    Local store of every recipe received from Spoonacular, persisted to a SQLite file.
+
+    Inverted indexes on cuisine, diet, intolerance safety, dish type and ingredient name, sorted servings and ready
+    time columns, and a columnar nutrient index narrow a search request to a few candidates, which are then checked
+    against the remaining constraints. search() answers a request locally when enough recipes match, and returns
+    None otherwise so the caller can fall back to Spoonacular.
+
+    A recipe only counts as safe for an intolerance once Spoonacular returned it for a search excluding that
+    intolerance, as recorded by confirm(), and its ingredients pass the local word list as well.
+    """
+    def __init__(self, path: Path = Path("cache", "recipe_store.sqlite"), pool_factor: int = LOCAL_POOL_FACTOR):
+        self.pool_factor = pool_factor
+        self.recipes = {}
+        self.cuisines = defaultdict(set)
+        self.diets = defaultdict(set)
+        self.free_of = defaultdict(set)
+        self.dish_types = defaultdict(set)
+        self.ingredients = defaultdict(set)
+        self.servings = []
+        self.ready_minutes = []
+        self.confirmed = defaultdict(set)
+        self.nutrients = NutrientIndex()
+        self.local_answers = 0
+        self.fallbacks = 0
+        self.lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS recipes (id INTEGER PRIMARY KEY, recipe TEXT NOT NULL)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS confirmed_free "
+            "(id INTEGER NOT NULL, intolerance TEXT NOT NULL, PRIMARY KEY (id, intolerance))"
+        )
+        self.db.commit()
+        for recipe_id, intolerance in self.db.execute("SELECT id, intolerance FROM confirmed_free"):
+            self.confirmed[recipe_id].add(intolerance)
+        for (recipe,) in self.db.execute("SELECT recipe FROM recipes"):
+            self.index(RecipeDetail.model_validate_json(recipe))
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def index(self, recipe: RecipeDetail):
+        self.recipes[recipe.id] = recipe
+        for cuisine in recipe.cuisines or []:
+            self.cuisines[cuisine].add(recipe.id)
+        for diet in DIET_LABELS:
+            if fits_diet(recipe, diet):
+                self.diets[diet].add(recipe.id)
+        for intolerance in self.confirmed.get(recipe.id, ()):
+            if intolerance in INTOLERANCE_INGREDIENTS and is_free_of(recipe, intolerance):
+                self.free_of[intolerance].add(recipe.id)
+        for dish_type in recipe.dishTypes or []:
+            self.dish_types[dish_type].add(recipe.id)
+        for name in ingredient_names(recipe):
+            self.ingredients[name].add(recipe.id)
+        if recipe.servings is not None:
+            bisect.insort(self.servings, (recipe.servings, recipe.id))
+        if recipe.readyInMinutes is not None:
+            bisect.insort(self.ready_minutes, (recipe.readyInMinutes, recipe.id))
+        self.nutrients.add([recipe])
+
+    def unindex(self, recipe: RecipeDetail):
+        # Recompute the keys the stored recipe was indexed under, so only those entries are touched
+        keys = [
+            *((self.cuisines, cuisine) for cuisine in recipe.cuisines or []),
+            *((self.diets, diet) for diet in DIET_LABELS),
+            *((self.free_of, intolerance) for intolerance in self.confirmed.get(recipe.id, ())),
+            *((self.dish_types, dish_type) for dish_type in recipe.dishTypes or []),
+            *((self.ingredients, name) for name in ingredient_names(recipe)),
+        ]
+        for index, key in keys:
+            if key in index:
+                index[key].discard(recipe.id)
+        if recipe.servings is not None:
+            remove_sorted(self.servings, (recipe.servings, recipe.id))
+        if recipe.readyInMinutes is not None:
+            remove_sorted(self.ready_minutes, (recipe.readyInMinutes, recipe.id))
+
+    def confirm(self, recipe_ids: list[int], intolerances: list[str]):
+        """
+        Record that Spoonacular returned these recipes for a search excluding these intolerances.
+
+        Parameters:
+        - recipe_ids: Ids of the returned recipes
+        - intolerances: Intolerances the search excluded
+        """
+        rows = [(i, intolerance) for i in recipe_ids if i is not None for intolerance in intolerances]
+        if not rows:
+            return
+        with self.lock:
+            for recipe_id, intolerance in rows:
+                self.confirmed[recipe_id].add(intolerance)
+                recipe = self.recipes.get(recipe_id)
+                if recipe is not None and intolerance in INTOLERANCE_INGREDIENTS and is_free_of(recipe, intolerance):
+                    self.free_of[intolerance].add(recipe_id)
+            self.db.executemany("INSERT OR IGNORE INTO confirmed_free (id, intolerance) VALUES (?, ?)", rows)
+            self.db.commit()
+
+    def ingest(self, recipes: list[RecipeDetail], intolerances: list[str] | None = None):
+        # Recipes without an id cannot be told apart and are skipped
+        recipes = [r for r in recipes if r.id is not None]
+        self.confirm([r.id for r in recipes], intolerances or [])
+        with self.lock:
+            for recipe in recipes:
+                if recipe.id in self.recipes:
+                    self.unindex(self.recipes[recipe.id])
+                self.index(recipe)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO recipes (id, recipe) VALUES (?, ?)",
+                [(r.id, r.model_dump_json(exclude_none=True)) for r in recipes]
+            )
+            self.db.commit()
+
+    def get(self, recipe_id: int) -> RecipeDetail | None:
+        # Only recipes with their instructions and nutrition stand in for fetched details
+        with self.lock:
+            recipe = self.recipes.get(recipe_id)
+        if recipe is None or not recipe.instructions or recipe.nutrition is None:
+            return None
+        return recipe
+
+    def ingredient_ids(self, ingredient: str) -> set[int]:
+        # Ingredient names are few next to recipes, so match the query against the names and join their recipes
+        ingredient = ingredient.lower()
+        ids = set()
+        for name, recipe_ids in self.ingredients.items():
+            if ingredient in name:
+                ids |= recipe_ids
+        return ids
+
+    def candidates(self, request: SearchRecipesRequest) -> set[int]:
+        # Intersect the index entries of every indexed constraint, starting from all recipes
+        ids = set(self.recipes)
+        if request.cuisine:
+            ids &= set().union(*(self.cuisines[c] for c in request.cuisine))
+        for cuisine in request.excludeCuisine or []:
+            ids -= self.cuisines[cuisine]
+        for diet in request.diet or []:
+            ids &= self.diets[diet]
+        for intolerance in request.intolerances or []:
+            ids &= self.free_of[intolerance]
+        if request.type is not None:
+            ids &= self.dish_types[request.type]
+        for ingredient in request.includeIngredients or []:
+            ids &= self.ingredient_ids(ingredient)
+        for ingredient in request.excludeIngredients or []:
+            ids -= self.ingredient_ids(ingredient)
+        if request.minServings is not None:
+            start = bisect.bisect_left(self.servings, (request.minServings, -1))
+            ids &= {recipe_id for _, recipe_id in self.servings[start:]}
+        if request.maxReadyTime is not None:
+            end = bisect.bisect_right(self.ready_minutes, (request.maxReadyTime, float("inf")))
+            ids &= {recipe_id for _, recipe_id in self.ready_minutes[:end]}
+        if has_nutrient_limits(request):
+            ids &= set(self.nutrients.filter(request).tolist())
+        return ids
+
+    def is_complete(self, recipe: RecipeDetail, request: SearchRecipesRequest) -> bool:
+        # A local recipe can only stand in for a search result if it carries the details the request asks for
+        if (request.instructionsRequired or request.addRecipeInstructions) and not recipe.instructions:
+            return False
+        return not request.addRecipeNutrition or recipe.nutrition is not None
+
+    def matching(self, request: SearchRecipesRequest) -> list[RecipeDetail]:
+        with self.lock:
+            recipes = [self.recipes[i] for i in sorted(self.candidates(request))]
+        return [r for r in recipes if self.is_complete(r, request) and matches(r, request)]
+
+    def search(self, request: SearchRecipesRequest) -> SearchRecipesResponse | None:
+        """
+        Answer a search request from the local recipes.
+
+        Parameters:
+        - request: Spoonacular search request
+
+        Returns:
+        - SearchRecipesResponse: A random sample of the matching recipes, or None if too few recipes match
+        """
+        # Free text queries are only understood by Spoonacular
+        if request.query:
+            return None
+        found = self.matching(request)
+        if len(found) < request.number * self.pool_factor:
+            self.fallbacks += 1
+            return None
+        self.local_answers += 1
+        results = random.sample(found, request.number)
+        return SearchRecipesResponse(results=results, offset=0, number=len(results), totalResults=len(found))
+
+    def stats(self) -> dict:
+        return {"recipes": len(self), "local_answers": self.local_answers, "fallbacks": self.fallbacks}
@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from classes import SearchRecipesRequest, SearchRecipesResponse
+
+
+def canonical_params(request: SearchRecipesRequest) -> str:
+    # The same search written with list values in another order, or another API key, shares a key
+    params = request.model_dump(exclude_none=True, exclude={"apiKey"})
+    params = {k: sorted(v, key=str) if isinstance(v, list) else v for k, v in params.items()}
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class SearchCache:
+    """
+    Persistent cache of Spoonacular search responses, keyed by the canonical request parameters.
+
+    Responses are stored zlib-compressed in a SQLite file and expire after their TTL. When the stored responses grow
+    beyond max_bytes the least recently used are evicted. Hits, misses and the quota points hits saved are counted.
+    """
+    def __init__(self,
+                 path: Path = Path("cache", "search_cache.sqlite"),
+                 ttl: float = 24 * 60 * 60,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.points_saved = 0.0
+        self.lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, expires REAL NOT NULL, accessed REAL NOT NULL, "
+            "size INTEGER NOT NULL, points REAL NOT NULL, response BLOB NOT NULL)"
+        )
+        self.db.execute("DELETE FROM search_cache WHERE expires <= ?", (time.time(),))
+        self.db.commit()
+
+    def get(self, request: SearchRecipesRequest) -> SearchRecipesResponse | None:
+        key = canonical_params(request)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT points, response FROM search_cache WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            points, response = row
+            self.hits += 1
+            self.points_saved += points
+            self.db.execute("UPDATE search_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.db.commit()
+        return SearchRecipesResponse.model_validate_json(zlib.decompress(response))
+
+    def put(self, request: SearchRecipesRequest, response: SearchRecipesResponse, points: float, ttl: float | None = None):
+        key = canonical_params(request)
+        body = zlib.compress(response.model_dump_json(exclude_none=True).encode())
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, expires, accessed, size, points, response) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, now + (self.ttl if ttl is None else ttl), now, len(body), points, body)
+            )
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        # Drop expired responses, then the least recently used until the stored responses fit in max_bytes
+        self.db.execute("DELETE FROM search_cache WHERE expires <= ?", (time.time(),))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.db.execute("SELECT key, size FROM search_cache ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.db.executemany("DELETE FROM search_cache WHERE key = ?", evicted)
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "points_saved": round(self.points_saved, 2),
+            }
@@ -0,0 +1,108 @@
+import json
+from typing import Callable
+from classes import *
+from spoonacular_api import search_recipes
+
+# Extra results fetched for each batched search, so every meal slot still gets a distinct recipe
+PLAN_OVERFETCH = 2
+
+# Most results complexSearch returns for one call
+MAX_NUMBER = 100
+
+
+def request_key(request: SearchRecipesRequest) -> str:
+    # Requests that differ only in how many results they want share a key
+    return json.dumps(request.model_dump(exclude={"apiKey", "number", "offset"}), sort_keys=True, default=str)
+
+
+def plan_requests(requests: list[SearchRecipesRequest],
+                  overfetch: int = PLAN_OVERFETCH) -> list[tuple[SearchRecipesRequest, list[int]]]:
+    """
+    Group identical search requests into one search each.
+
+    Parameters:
+    - requests: One request per meal slot
+    - overfetch: Extra results asked for by every search that serves more than one slot
+
+    Returns:
+    - list[tuple[SearchRecipesRequest, list[int]]]: Each batched search with the indexes of the slots it serves
+    """
+    groups = {}
+    for i, request in enumerate(requests):
+        groups.setdefault(request_key(request), []).append(i)
+
+    plan = []
+    for slots in groups.values():
+        number = sum(requests[i].number for i in slots)
+        if len(slots) > 1:
+            number += overfetch
+        batched = requests[slots[0]].model_copy(update={"number": min(number, MAX_NUMBER)})
+        plan.append((batched, slots))
+    return plan
+
+
+def assign_results(requests: list[SearchRecipesRequest],
+                   plan: list[tuple[SearchRecipesRequest, list[int]]],
+                   responses: list[SearchRecipesResponse | Exception]) -> list[SearchRecipesResponse | Exception]:
+    """
+    Hand the results of the batched searches out to the meal slots.
+
+    Every slot gets as many results as its request asked for, and no recipe is handed to two slots while a search
+    still has unused recipes. Slots are only given a recipe another slot already has when a search ran out.
+
+    Parameters:
+    - requests: The original request of every slot
+    - plan: The batched searches from plan_requests
+    - responses: One response per batched search, or the error it raised
+
+    Returns:
+    - list[SearchRecipesResponse | Exception]: One response or error per slot, in the order of requests
+    """
+    assigned = [None] * len(requests)
+    used = set()
+    for (_, slots), response in zip(plan, responses):
+        # A failed search fails every slot it serves
+        if isinstance(response, Exception):
+            for i in slots:
+                assigned[i] = response
+            continue
+
+        results = response.results or []
+        fresh = []
+        for recipe in results:
+            if recipe.id not in used:
+                used.add(recipe.id)
+                fresh.append(recipe)
+
+        for i in slots:
+            number = requests[i].number
+            picked, fresh = fresh[:number], fresh[number:]
+            if len(picked) < number:
+                ids = {r.id for r in picked}
+                picked += [r for r in results if r.id not in ids][:number - len(picked)]
+            assigned[i] = SearchRecipesResponse(
+                results=picked,
+                offset=response.offset,
+                number=len(picked),
+                totalResults=response.totalResults
+            )
+    return assigned
+
+
+def planned_search(requests: list[SearchRecipesRequest],
+                   search: Callable[[list[SearchRecipesRequest]], list[SearchRecipesResponse | Exception]] = search_recipes,
+                   overfetch: int = PLAN_OVERFETCH) -> list[SearchRecipesResponse | Exception]:
+    """
+    Search recipes with one call per distinct request instead of one call per meal.
+
+    Parameters:
+    - requests: One request per meal slot
+    - search: Function that runs the batched searches
+    - overfetch: Extra results asked for by every search that serves more than one slot
+
+    Returns:
+    - list[SearchRecipesResponse | Exception]: One response or error per slot, in the order of requests
+    """
+    plan = plan_requests(requests, overfetch)
+    responses = search([batched for batched, _ in plan])
+    return assign_results(requests, plan, responses)
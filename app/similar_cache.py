@@ -0,0 +1,134 @@
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable
+from classes import ExtractedInfo
+from extract_cache import normalize_prompt
+from fast_extract import NUMBER_WORDS
+
+# Words that do not change the extracted criteria and are dropped before comparing prompts
+FILLER_WORDS = {
+    "please", "thanks", "thank", "you", "people", "person", "persons", "the", "and", "i", "we", "me", "us",
+    "my", "our", "would", "like", "want", "need", "some", "can", "could", "just", "kindly", "hi", "hello", "hey",
+    "there", "so", "much",
+}
+
+# Large prime for the universal hash functions that stand in for random permutations
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def prompt_tokens(text: str) -> list[str]:
+    # Normalize the prompt, spell numbers as digits and drop filler words
+    tokens = re.findall(r"[a-z0-9]+", normalize_prompt(text))
+    tokens = [str(NUMBER_WORDS[t]) if t in NUMBER_WORDS and t not in ("a", "an") else t for t in tokens]
+    return [t for t in tokens if t not in FILLER_WORDS]
+
+
+def content_tokens(text: str) -> frozenset[str]:
+    # Every word left after the filler, any of which can change the extracted answer, an ingredient or cuisine as
+    # much as a number or a diet
+    return frozenset(prompt_tokens(text))
+
+
+def prompt_shingles(text: str, size: int = 4) -> set[int]:
+    # Character n-grams of the normalized token stream, hashed to 64 bit integers
+    joined = " ".join(prompt_tokens(text))
+    grams = {joined[i:i + size] for i in range(max(len(joined) - size + 1, 1))}
+    return {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "big") for g in grams}
+
+
+class SimilarPromptCache:
+    """
+    Cache of extracted meal criteria that also answers near-duplicate prompts.
+
+    Prompts are reduced to MinHash signatures over character n-grams and indexed with banded LSH, so a lookup only
+    compares against prompts that share at least one band. A stored ExtractedInfo is reused only when both prompts
+    have exactly the same words outside the filler words and the estimated Jaccard similarity is at or above the
+    threshold, so prompts that differ only in word order, spelling of numbers, punctuation or filler share answers.
+    """
+    def __init__(self,
+                 threshold: float = 0.85,
+                 num_perm: int = 64,
+                 bands: int = 16,
+                 shingle_size: int = 4,
+                 max_entries: int = 1024,
+                 seed: int = 1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+
+        # Fixed hash coefficients so signatures are comparable across runs
+        rng = random.Random(seed)
+        self.coefficients = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)]
+
+        self.entries = OrderedDict()
+        self.buckets = [{} for _ in range(bands)]
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def signature(self, text: str) -> tuple[int, ...]:
+        shingles = prompt_shingles(text, self.shingle_size)
+        return tuple(min((a * s + b) % MERSENNE_PRIME for s in shingles) for a, b in self.coefficients)
+
+    def band_keys(self, signature: tuple[int, ...]) -> list[tuple[int, ...]]:
+        return [signature[band * self.rows:(band + 1) * self.rows] for band in range(self.bands)]
+
+    def similarity(self, first: tuple[int, ...], second: tuple[int, ...]) -> float:
+        # Fraction of matching MinHash values estimates the Jaccard similarity
+        return sum(a == b for a, b in zip(first, second)) / self.num_perm
+
+    def lookup(self, text: str) -> tuple[ExtractedInfo | None, float]:
+        signature = self.signature(text)
+        content = content_tokens(text)
+        with self.lock:
+            candidates = set()
+            for band, key in enumerate(self.band_keys(signature)):
+                candidates.update(self.buckets[band].get(key, ()))
+
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                if self.entries[entry_id][1] != content:
+                    continue
+                score = self.similarity(signature, self.entries[entry_id][0])
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                return None, best_score
+            self.entries.move_to_end(best_id)
+            return self.entries[best_id][2], best_score
+
+    def get(self, text: str) -> ExtractedInfo | None:
+        return self.lookup(text)[0]
+
+    def put(self, text: str, info: ExtractedInfo):
+        signature = self.signature(text)
+        content = content_tokens(text)
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (signature, content, info)
+            for band, key in enumerate(self.band_keys(signature)):
+                self.buckets[band].setdefault(key, set()).add(entry_id)
+
+            # Evict the least recently used prompts beyond the limit
+            while len(self.entries) > self.max_entries:
+                old_id, (old_signature, _, _) = self.entries.popitem(last=False)
+                for band, key in enumerate(self.band_keys(old_signature)):
+                    self.buckets[band][key].discard(old_id)
+                    if not self.buckets[band][key]:
+                        del self.buckets[band][key]
+
+    def get_or_extract(self, text: str, extract: Callable[[str], ExtractedInfo]) -> ExtractedInfo:
+        info = self.get(text)
+        if info is None:
+            info = extract(text)
+            self.put(text, info)
+        return info
@@ -0,0 +1,82 @@
+import re
+from dspy_data import train_set, dev_set
+from classes import ExtractedInfo
+from enums import Cuisine
+from similar_cache import SimilarPromptCache
+
+# Digits spelled out for the paraphrased prompts
+DIGIT_WORDS = {"1": "one", "2": "two", "3": "three", "4": "four", "5": "five", "6": "six", "7": "seven", "8": "eight"}
+
+# Surface rewrites a user might make without changing what they are asking for
+def paraphrases(text: str) -> list[str]:
+    return [
+        text.lower(),
+        re.sub(r"\b[1-8]\b", lambda m: DIGIT_WORDS[m.group()], text),
+        text.rstrip(".") + " please!",
+        "  ".join(text.replace(",", " -").split(" ")),
+        "Hi there! " + text + " Thanks so much.",
+        text.replace("Plan", "Please plan").replace("Create", "Can you create"),
+    ]
+
+# Stand-ins for an ingredient or cuisine the prompt names
+SWAP_INGREDIENTS = ["mushrooms", "celery"]
+SWAP_CUISINES = ["Thai", "Mexican"]
+
+def swaps(text: str, names: list[str], replacements: list[str]) -> list[str]:
+    # Replace the first name found in the prompt with each replacement it does not already name
+    for name in names:
+        if name.lower() in text.lower():
+            pattern = re.compile(re.escape(name), re.IGNORECASE)
+            return [pattern.sub(r, text, count=1) for r in replacements if r.lower() not in text.lower()]
+    return []
+
+# Rewrites that change the criteria, so reusing the cached answer would be wrong
+def alterations(example) -> list[str]:
+    text = example.text
+    output = example.output
+    altered = [
+        re.sub(r"\b([1-8])\b", lambda m: str(int(m.group()) % 8 + 1), text, count=1),
+        text.replace("low", "high") if "low" in text else text.replace("high", "low"),
+        text.rstrip(".") + ", and nothing with shellfish.",
+        *swaps(text, output["include_ingredients"] + output["exclude_ingredients"], SWAP_INGREDIENTS),
+        *swaps(text, output["include_cuisines"] + output["exclude_cuisines"] + [c.value for c in Cuisine], SWAP_CUISINES),
+    ]
+    return [a for a in altered if a != text]
+
+# Fraction of fields where the reused answer matches the gold answer
+def field_agreement(reused: ExtractedInfo, gold: dict) -> float:
+    values = reused.model_dump()
+    return sum(values[field] == gold[field] for field in gold) / len(gold)
+
+def evaluate(threshold: float):
+    cache = SimilarPromptCache(threshold=threshold)
+    for example in train_set:
+        cache.put(example.text, ExtractedInfo(**example.output))
+
+    # Paraphrases of cached prompts should hit and reuse an answer that matches their gold output
+    lookups = [(text, example.output) for example in train_set for text in paraphrases(example.text)]
+    lookups += [(example.text, example.output) for example in dev_set]
+
+    hits = 0
+    agreement = 0.0
+    exact = 0
+    for text, gold in lookups:
+        reused = cache.get(text)
+        if reused is not None:
+            hits += 1
+            score = field_agreement(reused, gold)
+            agreement += score
+            exact += score == 1.0
+
+    # Any reuse for an altered prompt is a wrong answer
+    altered = [text for example in train_set for text in alterations(example)]
+    false_hits = sum(cache.get(text) is not None for text in altered)
+
+    accuracy = f"{agreement / hits:.3f}" if hits else "-"
+    exact_rate = f"{exact / hits:.3f}" if hits else "-"
+    print(f"{threshold:>10.2f}{hits / len(lookups):>10.3f}{accuracy:>12}{exact_rate:>10}{false_hits / len(altered):>12.3f}")
+
+print(f"{len(train_set)} cached prompts, paraphrased train_set and dev_set lookups, altered train_set lookups")
+print(f"{'threshold':>10}{'hit rate':>10}{'field acc':>12}{'exact':>10}{'false reuse':>12}")
+for threshold in (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95):
+    evaluate(threshold)
@@ -0,0 +1,158 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from classes import *
+from search_planner import planned_search
+from recipe_store import matches
+
+# Fields the search cannot start without, the rest only narrow the results. People per meal is waited for because
+# few fetched recipes meet a larger minServings than the one they were searched with, and it resolves alongside the
+# meal types anyway
+SEARCH_FIELDS = ["meal_count", "people_per_meal", "meal_types", "diets", "intolerances"]
+
+# Placeholders for fields that have not resolved when the search starts, chosen so the search is never narrower
+PROVISIONAL_VALUES = {
+    "include_cuisines": [],
+    "exclude_cuisines": [],
+    "include_ingredients": [],
+    "exclude_ingredients": [],
+    "high_fiber": False,
+    "high_protein": False,
+    "low_calorie": False,
+    "low_carb": False,
+    "low_fat": False,
+    "low_cholesterol": False,
+    "low_sat_fat": False,
+    "low_sodium": False,
+}
+
+# Request parameters that can be applied to already fetched recipes instead of searching again
+LOCAL_FILTER_PARAMS = {"minServings", "cuisine", "excludeCuisine", "includeIngredients", "excludeIngredients", *NUTRIENT_PARAMS}
+
+# Extra results fetched per speculative request so constraints that arrive later can be applied locally
+OVERFETCH = 5
+
+
+def request_params(request: SearchRecipesRequest) -> dict:
+    return request.model_dump(exclude={"apiKey", "number"})
+
+
+def is_looser(param: str, speculative, final) -> bool:
+    # The speculative request must not have excluded anything the final request allows
+    if speculative in (None, []):
+        return True
+    return param == "minServings" and final is not None and speculative <= final
+
+
+def changed_params(speculative: SearchRecipesRequest, final: SearchRecipesRequest) -> set[str]:
+    speculative_params = request_params(speculative)
+    final_params = request_params(final)
+    return {p for p in final_params if speculative_params[p] != final_params[p]}
+
+
+def reconcile(speculative: SearchRecipesRequest,
+              response: SearchRecipesResponse,
+              final: SearchRecipesRequest) -> SearchRecipesResponse | None:
+    """
+    Reuse a speculative search response for the final request when possible.
+
+    Parameters:
+    - speculative: The request that was sent before every field had resolved
+    - response: The response to the speculative request
+    - final: The request built from the complete extracted info
+
+    Returns:
+    - SearchRecipesResponse: The response narrowed to the final request, or None if it has to be searched again
+    """
+    speculative_params = request_params(speculative)
+    final_params = request_params(final)
+    changed = changed_params(speculative, final)
+    if not changed <= LOCAL_FILTER_PARAMS:
+        return None
+    if not all(is_looser(p, speculative_params[p], final_params[p]) for p in changed):
+        return None
+
+    results = response.results or []
+    if changed:
+        results = [r for r in results if matches(r, final)]
+        if len(results) < final.number:
+            return None
+    results = results[:final.number]
+    return SearchRecipesResponse(results=results, offset=response.offset, number=len(results), totalResults=response.totalResults)
+
+
+class SpeculativeSearch:
+    """
+    Start the recipe search as soon as the search-critical fields are extracted.
+
+    Feed every extracted field to update(). Once the meal count, people per meal, meal types, diets and
+    intolerances are known the search runs in the background with the remaining fields at their loosest values and
+    some extra results. finish() validates the complete info and narrows the speculative results locally, searching
+    again only for requests whose results cannot be narrowed. Use it as a context manager, or call close(), so its
+    worker thread is released when extraction fails before finish().
+
+    With a hydrate function the search is expected to return recipe summaries. Summaries lack the servings,
+    ingredients and nutrition checked locally, so a response that would have to be narrowed is searched again with
+    search_again, which returns full details, and only the recipes finish() returns are hydrated.
+    """
+    def __init__(self,
+                 search: Callable[[list[SearchRecipesRequest]], list[SearchRecipesResponse | Exception]] = planned_search,
+                 overfetch: int = OVERFETCH,
+                 hydrate: Callable[[list[SearchRecipesResponse | Exception]], list[SearchRecipesResponse | Exception]] | None = None,
+                 search_again: Callable[[list[SearchRecipesRequest]], list[SearchRecipesResponse | Exception]] | None = None):
+        self.search = search
+        self.overfetch = overfetch
+        self.hydrate = hydrate
+        self.search_again = search_again or search
+        self.values = {}
+        self.requests = None
+        self.future: Future | None = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def update(self, field: str, value):
+        self.values[field] = value
+        if self.future is None and all(f in self.values for f in SEARCH_FIELDS):
+            self.start()
+
+    def start(self):
+        info = ExtractedInfo(**{**PROVISIONAL_VALUES, **self.values})
+        self.requests = info_to_requests(info)
+        for request in self.requests:
+            request.number += self.overfetch
+        self.future = self.executor.submit(self.search, self.requests)
+
+    def finish(self) -> tuple[ExtractedInfo, list[SearchRecipesResponse | Exception]]:
+        # Validate the assembled info before searching with it
+        info = ExtractedInfo(**self.values)
+        final_requests = info_to_requests(info)
+
+        try:
+            if self.future is None:
+                return info, self.hydrated(self.search(final_requests))
+            responses = self.future.result()
+        finally:
+            self.executor.shutdown(wait=False)
+
+        # Narrow each speculative response, and search again for the requests that cannot be narrowed or failed.
+        # Summaries cannot be checked locally, so a summary response is only reused when nothing changed
+        reconciled = [
+            None if isinstance(r, Exception) or (self.hydrate is not None and changed_params(s, f)) else reconcile(s, r, f)
+            for s, r, f in zip(self.requests, responses, final_requests)
+        ]
+        missing = [i for i, response in enumerate(reconciled) if response is None]
+        if missing:
+            for i, response in zip(missing, self.search_again([final_requests[i] for i in missing])):
+                reconciled[i] = response
+        return info, self.hydrated(reconciled)
+
+    def close(self):
+        # Drop a search that has not started, for example when extraction failed before finish()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "SpeculativeSearch":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def hydrated(self, responses: list[SearchRecipesResponse | Exception]) -> list[SearchRecipesResponse | Exception]:
+        return responses if self.hydrate is None else self.hydrate(responses)
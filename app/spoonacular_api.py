@@ -1,30 +1,271 @@
-import requests
+import heapq
+import itertools
 import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from http_transport import session
+from search_cache import SearchCache
+from recipe_store import RecipeStore
 from classes import *
 from pprint import pprint
 
+# Most searches sent to Spoonacular at once by one search_recipes call
+search_max_in_flight = int(os.getenv("SPOONACULAR_MAX_IN_FLIGHT", "4"))
+
+
+# Every recipe received is kept in a local store that answers searches it has enough recipes for, unless RECIPE_STORE=0
+recipe_store = RecipeStore() if os.getenv("RECIPE_STORE", "1") == "1" else None
+
+# Quota points Spoonacular charges a search, per result returned, and per result for each detail it adds
+SEARCH_POINTS = 1.0
+RESULT_POINTS = 0.01
+DETAIL_POINTS = 0.025
+
+# Responses are cached on disk unless SEARCH_CACHE=0, for SEARCH_CACHE_TTL seconds
+search_cache = SearchCache(ttl=float(os.getenv("SEARCH_CACHE_TTL", str(24 * 60 * 60)))) if os.getenv("SEARCH_CACHE", "1") == "1" else None
+
+
+# Quota points Spoonacular charges a bulk information call for its first recipe and for every further recipe
+BULK_FIRST_POINTS = 1.0
+BULK_EXTRA_POINTS = 0.5
+
+
+def request_points(meal: SearchRecipesRequest) -> float:
+    # Estimated quota cost of a search when every requested result is returned
+    details = meal.addRecipeNutrition + meal.addRecipeInstructions
+    return SEARCH_POINTS + meal.number * (RESULT_POINTS + details * DETAIL_POINTS)
+
+
+# Priority lanes of the quota limiter, interactive searches are served before batch searches
+INTERACTIVE = 0
+BATCH = 1
+
+
+# Statuses Spoonacular turns a request away with when the rate or quota is exceeded, and times such a request is
+# queued again before its error is returned
+QUOTA_STATUSES = (402, 429)
+QUOTA_RETRIES = 3
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+def retry_after(headers) -> float | None:
+    # Seconds to hold off from a Retry-After header, given either as seconds or as an HTTP date
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaLimiter:
+    """
+    Token bucket of Spoonacular quota points shared by every search.
+
+    Each search waits until the bucket holds its estimated cost, so bursts are smoothed out instead of failing with
+    402 or 429 part way through a plan. Waiting searches are served by priority lane and then in arrival order.
+    The quota headers of every response correct the estimate and track the points left for the day, and a search
+    that would exceed them fails before it is sent. A 402 or 429 empties the bucket and holds every search until
+    its Retry-After has passed.
+    """
+    def __init__(self, rate: float, burst: float):
+        # The wait for a refill is the missing points divided by the rate
+        if rate <= 0:
+            raise ValueError(f"Quota rate must be positive, got {rate}")
+        if burst <= 0:
+            raise ValueError(f"Quota burst must be positive, got {burst}")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.quota_used = None
+        self.quota_left = None
+        self.quota_day = None
+        self.waiting = []
+        self.tickets = itertools.count()
+        self.condition = threading.Condition()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, points: float, priority: int = INTERACTIVE):
+        # A search costing more than the bucket holds waits for a full bucket and leaves it in debt
+        needed = min(points, self.burst)
+        with self.condition:
+            # The daily quota resets at midnight UTC, forget the points left from an earlier day
+            if self.quota_day != datetime.now(timezone.utc).date():
+                self.quota_used = self.quota_left = None
+            if self.quota_left is not None and points > self.quota_left:
+                raise QuotaExhausted(f"Search needs {points:.2f} quota points, {self.quota_left:.2f} left today")
+
+            ticket = (priority, next(self.tickets))
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    self.refill()
+                    first = self.waiting[0] == ticket
+                    held = self.resume_at - time.monotonic()
+                    if first and held <= 0 and self.tokens >= needed:
+                        heapq.heappop(self.waiting)
+                        self.tokens -= points
+                        self.condition.notify_all()
+                        return
+                    self.condition.wait(timeout=max(held, (needed - self.tokens) / self.rate) if first else None)
+            except BaseException:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+                raise
+
+    def settle(self, points: float, headers: dict, status: int):
+        # Correct the estimate with the charged points and record what is left of the day's quota
+        with self.condition:
+            if "X-API-Quota-Request" in headers:
+                self.tokens += points - float(headers["X-API-Quota-Request"])
+            if "X-API-Quota-Used" in headers:
+                self.quota_used = float(headers["X-API-Quota-Used"])
+            if "X-API-Quota-Left" in headers:
+                self.quota_left = float(headers["X-API-Quota-Left"])
+                self.quota_day = datetime.now(timezone.utc).date()
+            if status in QUOTA_STATUSES:
+                self.tokens = min(self.tokens, 0.0)
+                delay = retry_after(headers)
+                if delay is not None:
+                    self.resume_at = max(self.resume_at, time.monotonic() + delay)
+            self.condition.notify_all()
+
+    def stats(self) -> dict:
+        with self.condition:
+            self.refill()
+            return {
+                "tokens": round(self.tokens, 2),
+                "waiting": len(self.waiting),
+                "quota_used": self.quota_used,
+                "quota_left": self.quota_left,
+            }
+
+
+# Quota points the searches may spend per second on average, and in one burst
+quota_limiter = QuotaLimiter(
+    rate=float(os.getenv("SPOONACULAR_POINTS_PER_SECOND", "1")),
+    burst=float(os.getenv("SPOONACULAR_POINTS_BURST", "10"))
+)
+
+
+def quota_get(url: str, params: dict, points: float, priority: int = INTERACTIVE) -> requests.Response:
+    # Send a request once the quota allows it, queueing it again at its priority when it is turned away for rate or
+    # quota, until the retries run out or the day's quota is gone
+    for _ in range(QUOTA_RETRIES + 1):
+        quota_limiter.acquire(points, priority)
+        response = session.get(url, params=params)
+        quota_limiter.settle(points, response.headers, response.status_code)
+        if response.status_code not in QUOTA_STATUSES:
+            break
+    return response
+
+
+# Function to run one recipe search using Spoonacular API
+def search_recipe(meal: SearchRecipesRequest, priority: int = INTERACTIVE) -> SearchRecipesResponse:
+    url = "https://api.spoonacular.com/recipes/complexSearch"
+
+    if recipe_store is not None:
+        local = recipe_store.search(meal)
+        if local is not None:
+            return local
+
+    if search_cache is not None:
+        cached = search_cache.get(meal)
+        if cached is not None:
+            return cached
+
+    points = request_points(meal)
+    meal.apiKey = os.getenv("SPOONAPIKEY")
+    params = meal.model_dump(exclude_none=True)
+    response = quota_get(url, params, points, priority)
+    response.raise_for_status()
+
+    data = response.json()
+    # pprint(data)
+    recipes = SearchRecipesResponse(**data)
+    # Lightweight searches return summaries only, which must not replace stored recipe details, but they still vouch
+    # for the intolerances the search excluded
+    if recipe_store is not None:
+        if meal.addRecipeInstructions and meal.addRecipeNutrition:
+            recipe_store.ingest(recipes.results or [], meal.intolerances)
+        else:
+            recipe_store.confirm([r.id for r in recipes.results or []], meal.intolerances or [])
+    if search_cache is not None:
+        search_cache.put(meal, recipes, points)
+    return recipes
+
+
+def try_search_recipe(meal: SearchRecipesRequest, priority: int = INTERACTIVE) -> SearchRecipesResponse | Exception:
+    # Return the error in place of the response, so one failed search does not discard the others
+    try:
+        return search_recipe(meal, priority)
+    except Exception as e:
+        return e
+
+
 # Function to search recipes using Spoonacular API
-def search_recipes(model: list[SearchRecipesRequest]) -> list[SearchRecipesResponse]:
+def search_recipes(model: list[SearchRecipesRequest],
+                   max_in_flight: int = search_max_in_flight,
+                   priority: int = INTERACTIVE) -> list[SearchRecipesResponse | Exception]:
     """
-    Search for recipes using Spoonacular API.
+    Search for recipes using Spoonacular API, running up to max_in_flight searches at once.
 
     Parameters:
-    - SearchRecipesRequest: Spoonacular API request object
+    - model: Spoonacular API request objects
+    - max_in_flight: Most searches sent at once
+    - priority: Quota limiter lane, INTERACTIVE for searches a user waits on and BATCH for background jobs
 
     Returns:
-    - SearchRecipesResponse: Parsed response model
+    - list[SearchRecipesResponse | Exception]: Parsed response model for each request in order, or the error the
+      search raised
     """
-    url = "https://api.spoonacular.com/recipes/complexSearch"
+    if len(model) <= 1:
+        return [try_search_recipe(meal, priority) for meal in model]
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(model))) as executor:
+        return list(executor.map(lambda meal: try_search_recipe(meal, priority), model))
+
+
+# Function to fetch the full details of many recipes in one call using Spoonacular API
+def get_recipe_information_bulk(ids: list[int], priority: int = INTERACTIVE) -> list[RecipeDetail]:
+    """
+    Fetch recipe details, with nutrition, using the informationBulk endpoint.
+
+    Parameters:
+    - ids: Spoonacular recipe ids
+    - priority: Quota limiter lane
+
+    Returns:
+    - list[RecipeDetail]: Details of each recipe Spoonacular knows
+    """
+    url = "https://api.spoonacular.com/recipes/informationBulk"
+    if not ids:
+        return []
+
+    points = BULK_FIRST_POINTS + BULK_EXTRA_POINTS * (len(ids) - 1)
+    params = {"apiKey": os.getenv("SPOONAPIKEY"), "ids": ",".join(str(i) for i in ids), "includeNutrition": True}
+    response = quota_get(url, params, points, priority)
+    response.raise_for_status()
 
-    recipes = []
-    for meal in model:
-        meal.apiKey = os.getenv("SPOONAPIKEY")
-        params = meal.model_dump(exclude_none=True)
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-
-        data = response.json()
-        # pprint(data)
-        recipe = SearchRecipesResponse(**data)
-        recipes.append(recipe)
-    return recipes
\ No newline at end of file
+    details = [RecipeDetail(**data) for data in response.json()]
+    if recipe_store is not None:
+        recipe_store.ingest(details)
+    return details
@@ -0,0 +1,47 @@
+import re
+import threading
+import time
+import dspy
+from classes import ExtractedInfo
+
+# Placeholder answers by output field type, so every signature parses
+DEFAULT_VALUES = {
+    "str": "Stand-in answer.",
+    "int": "1",
+    "bool": "False",
+    "list[str]": "[]",
+    "ExtractedInfo": ExtractedInfo(
+        meal_count=1, people_per_meal=1, meal_types=[], include_cuisines=[], exclude_cuisines=[], diets=[],
+        intolerances=[], include_ingredients=[], exclude_ingredients=[], high_fiber=False, high_protein=False,
+        low_calorie=False, low_carb=False, low_fat=False, low_cholesterol=False, low_sat_fat=False, low_sodium=False
+    ).model_dump_json(),
+}
+
+
+class StandInLM(dspy.LM):
+    """
+    Local stand-in for the ollama model, used to benchmark scheduling without a model server.
+
+    Each call sleeps for a fixed latency and at most max_parallel calls are served at once, like an ollama server
+    started with OLLAMA_NUM_PARALLEL. Answers are placeholder values in the chat adapter format.
+    """
+    def __init__(self, latency: float = 0.05, max_parallel: int = 4):
+        super().__init__(model="standin/standin", cache=False)
+        self.latency = latency
+        self.slots = threading.Semaphore(max_parallel)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt: str | None = None, messages: list[dict] | None = None, **kwargs) -> list[str]:
+        with self.lock:
+            self.calls += 1
+        with self.slots:
+            time.sleep(self.latency)
+
+        # Answer every output field listed in the field descriptions
+        content = "\n".join(m["content"] for m in messages)
+        section = content.split("Your output fields are:", 1)[1].split("All interactions", 1)[0]
+        answer = ""
+        for field, field_type in re.findall(r"`(\w+)` \(([^)]+)\)", section):
+            answer += f"[[ ## {field} ## ]]\n{DEFAULT_VALUES.get(field_type, '')}\n\n"
+        return [answer + "[[ ## completed ## ]]"]